@@ -0,0 +1,42 @@
+import pandas as pd
+
+from rules import AT_RISK_SCORE
+
+SKILL_COLUMNS = [
+    "Midterm_Score", "Final_Score", "Assignments_Avg",
+    "Quizzes_Avg", "Participation_Score", "Projects_Score"
+]
+
+TOP_QUANTILE = 0.9
+SUMMARY_QUANTILES = [0.25, 0.5, 0.75, TOP_QUANTILE]
+
+def compute_aggregates(df: pd.DataFrame, version: str) -> dict:
+    """Statistics shared by every summary/per-student request for one upload.
+
+    Computed once when the data is stored, so readers never rescan the frame.
+    """
+    aggregates = {"version": version, "rows": len(df)}
+    if df.empty or "Final_Score" not in df.columns:
+        return aggregates
+
+    final = df["Final_Score"]
+    aggregates["average_score"] = round(float(final.mean()), 2)
+    aggregates["at_risk_students"] = int((final < AT_RISK_SCORE).sum())
+    aggregates["final_score_quantiles"] = {
+        str(q): round(float(v), 2) for q, v in final.quantile(SUMMARY_QUANTILES).items()
+    }
+
+    if "Predicted_Score" in df.columns:
+        aggregates["predicted_at_risk"] = int((df["Predicted_Score"] < AT_RISK_SCORE).sum())
+
+    skill_columns = [col for col in SKILL_COLUMNS if col in df.columns]
+    if skill_columns:
+        skills = df[skill_columns]
+        threshold = skills["Final_Score"].quantile(TOP_QUANTILE)
+        top_students = skills[skills["Final_Score"] >= threshold]
+        aggregates["class_averages"] = skills.mean().round(2).to_dict()
+        aggregates["top_threshold"] = float(threshold)
+        aggregates["top_performer_averages"] = top_students.mean().round(2).to_dict()
+        aggregates["top_performer_count"] = len(top_students)
+
+    return aggregates
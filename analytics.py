@@ -1,7 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+
+from dataset_store import get_dataset_store
+from metrics import instrument, stage
+from timeseries import DOWNSAMPLE_METHODS, format_dates, get_timeseries_store, parse_dates
 
 app = FastAPI()
 
@@ -13,31 +19,112 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency/size metrics, stage timers and /metrics
+instrument(app, "analytics")
+
 class DataPoint(BaseModel):
     x: float
     y: float
     date: str
 
-attendance_data_store = []
-performance_data_store = []
+# Series are published as immutable snapshots shared by every worker
+attendance_data_store = get_dataset_store("attendance")
+performance_data_store = get_dataset_store("performance")
+
+def publish_points(store, data: List[DataPoint]):
+    store.publish(pd.DataFrame([point.dict() for point in data], columns=["x", "y", "date"]))
+
+def read_points(store) -> list:
+    snapshot = store.current()
+    if snapshot is None:
+        return []
+    return snapshot.frame.to_dict(orient="records")
+
+# Append-only series held as date-sorted arrays and persisted to disk,
+# served by the /api/series endpoints
+SERIES = {
+    "attendance": get_timeseries_store("attendance"),
+    "performance": get_timeseries_store("performance"),
+}
+
+def get_series(name: str):
+    store = SERIES.get(name)
+    if store is None:
+        raise HTTPException(status_code=404, detail=f"Unknown series '{name}'.")
+    return store
+
+def to_arrays(data: List[DataPoint]):
+    try:
+        dates = parse_dates([point.date for point in data])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {str(e)}")
+    x = np.fromiter((point.x for point in data), dtype=np.float64, count=len(data))
+    y = np.fromiter((point.y for point in data), dtype=np.float64, count=len(data))
+    return dates, x, y
+
+def mirror_points(name: str, data: List[DataPoint]) -> bool:
+    # The legacy save endpoints also replace the matching series, when
+    # every date in the upload parses; False when the series was left as is
+    try:
+        SERIES[name].replace(*to_arrays(data))
+    except HTTPException:
+        return False
+    return True
+
+def query_points(store, start, end, max_points, method) -> dict:
+    try:
+        with stage("analytics", "query"):
+            result = store.query(start, end, max_points, method)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with stage("analytics", "serialize"):
+        dates = format_dates(result["dates"])
+        points = [
+            {"x": x, "y": y, "date": date}
+            for x, y, date in zip(result["x"].tolist(), result["y"].tolist(), dates)
+        ]
+    return {"matched": result["matched"], "downsampled": result["downsampled"], "points": points}
+
+# Shared query parameters: an inclusive date range and an optional point budget
+RANGE_START = Query(None, description="Earliest date to include (inclusive)")
+RANGE_END = Query(None, description="Latest date to include (inclusive)")
+MAX_POINTS = Query(None, ge=3, description="Downsample to at most this many points")
+METHOD = Query("lttb", description="Downsampling method: " + " or ".join(DOWNSAMPLE_METHODS))
+
+# Handlers that touch the series or dataset files are plain functions, so
+# FastAPI runs them in its threadpool rather than on the event loop
+
+@app.post("/api/series/{name}/append")
+def append_points(name: str, data: List[DataPoint]):
+    store = get_series(name)
+    total = store.append(*to_arrays(data))
+    return {"status": "success", "appended": len(data), "total": total}
+
+@app.get("/api/series/{name}")
+def read_series(name: str, start: Optional[str] = RANGE_START, end: Optional[str] = RANGE_END,
+                      max_points: Optional[int] = MAX_POINTS, method: str = METHOD):
+    store = get_series(name)
+    return {"series": name, **query_points(store, start, end, max_points, method)}
+
+# The legacy endpoints below keep their original behaviour: points are
+# stored and returned as posted, in posted order, with any date string
 
 @app.post("/api/save_attendance")
-async def save_attendance(data: List[DataPoint]):
-    global attendance_data_store
-    attendance_data_store = data
-    return {"status": "success", "message": "Attendance saved"}
+def save_attendance(data: List[DataPoint]):
+    publish_points(attendance_data_store, data)
+    mirrored = mirror_points("attendance", data)
+    return {"status": "success", "message": "Attendance saved", "mirrored": mirrored}
 
 @app.post("/api/save_performance")
-async def save_performance(data: List[DataPoint]):
-    global performance_data_store
-    performance_data_store = data
-    return {"status": "success", "message": "Performance saved"}
+def save_performance(data: List[DataPoint]):
+    publish_points(performance_data_store, data)
+    mirrored = mirror_points("performance", data)
+    return {"status": "success", "message": "Performance saved", "mirrored": mirrored}
 
 @app.get("/api/get_attendance")
-async def get_attendance():
-    return attendance_data_store
+def get_attendance():
+    return read_points(attendance_data_store)
 
 @app.get("/api/get_performance")
-async def get_performance():
-    return performance_data_store
-
+def get_performance():
+    return read_points(performance_data_store)
@@ -1,84 +1,282 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import joblib
-import pandas as pd
-
-from fastapi.middleware.cors import CORSMiddleware
-
-
-
-app = FastAPI()
-
-# Allow all origins for testing (change to specific frontend URL in production)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-# Load model with error handling
-try:
-    model = joblib.load("student_performance_pipeline.joblib")
-    print("✅ Model loaded successfully.")
-except Exception as e:
-    print("❌ Error loading model:", e)
-    model = None
-
-class InputData(BaseModel):
-    Age: int
-    Quizzes_Avg: float
-    Final_Score: float
-    Study_Hours_per_Week: float
-    Stress_Level: int  # scale 1-10
-    Projects_Score: float
-    Participation_Score: float
-    Sleep_Hours_per_Night: float
-    Attendance: float  # will rename to 'Attendance (%)'
-    Midterm_Score: float
-    Assignments_Avg: float
-
-    Gender: str
-    Department: str
-    Extracurricular_Activities: str
-    Internet_Access_at_Home: str
-    Parent_Education_Level: str
-    Family_Income_Level: str
-    Grade: str
-
-@app.post("/predict")
-def predict(data: InputData):
-    if model is None:
-        return {"error": "Model not loaded."}
-
-    input_dict = data.dict()
-
-    # Rename keys to match model expected columns
-    input_dict['Attendance (%)'] = input_dict.pop('Attendance')
-    input_dict['Stress_Level (1-10)'] = input_dict.pop('Stress_Level')
-
-    # Create DataFrame for prediction
-    input_df = pd.DataFrame([input_dict])
-
-    try:
-        prediction = model.predict(input_df)[0]
-    except Exception as e:
-        return {"error": f"Prediction error: {str(e)}"}
-
-    advice = []
-    if input_dict['Attendance (%)'] < 75:
-        advice.append("Your attendance is below average. Try to attend more classes.")
-    if input_dict['Study_Hours_per_Week'] < 10:
-        advice.append("Consider increasing your study hours to improve your score.")
-    if prediction < 50:
-        advice.append("You are currently at risk. Seek additional help and support.")
-    else:
-        advice.append("Keep up the good work!")
-
-    return {
-        "predicted_score": round(prediction, 2),
-        "feedback": advice
-    }
-
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from fastapi.middleware.cors import CORSMiddleware
+
+from batching import MicroBatcher
+from metrics import instrument, stage, timed_predict
+from compiled_model import CompiledPipeline
+from model_store import get_model_store
+from prediction_cache import get_prediction_cache
+from rules import ADVICE_RULES, AT_RISK_SCORE
+
+
+app = FastAPI()
+
+# Allow all origins for testing (change to specific frontend URL in production)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"], 
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Request latency/size metrics, stage timers and /metrics
+instrument(app, "api")
+
+
+# Shared, memory-mapped model that hot-reloads when the artifact is replaced
+model_store = get_model_store()
+
+# Predictions keyed by feature-row hash and model version
+prediction_cache = get_prediction_cache()
+
+class InputData(BaseModel):
+    Age: int
+    Quizzes_Avg: float
+    Final_Score: float
+    Study_Hours_per_Week: float
+    Stress_Level: int  # scale 1-10
+    Projects_Score: float
+    Participation_Score: float
+    Sleep_Hours_per_Night: float
+    Attendance: float  # will rename to 'Attendance (%)'
+    Midterm_Score: float
+    Assignments_Avg: float
+
+    Gender: str
+    Department: str
+    Extracurricular_Activities: str
+    Internet_Access_at_Home: str
+    Parent_Education_Level: str
+    Family_Income_Level: str
+    Grade: str
+
+# API field name -> column name the pipeline was trained on
+COLUMN_RENAMES = {
+    'Attendance': 'Attendance (%)',
+    'Stress_Level': 'Stress_Level (1-10)',
+}
+
+def to_model_frame(items: List[InputData]) -> pd.DataFrame:
+    # One DataFrame for the whole batch, renamed once
+    df = pd.DataFrame([item.dict() for item in items])
+    return df.rename(columns=COLUMN_RENAMES)
+
+def batch_feedback(df: pd.DataFrame, predictions: np.ndarray) -> List[List[str]]:
+    # Same rules as the single-row path, evaluated as column masks
+    return ADVICE_RULES.evaluate(df, overrides={"Predicted_Score": predictions})
+
+def parse_batch(body: bytes, content_type: str) -> List[InputData]:
+    # Accept either a JSON array or newline-delimited JSON objects
+    if "ndjson" in content_type:
+        records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        records = json.loads(body)
+    if not isinstance(records, list):
+        raise ValueError("Expected a list of inputs.")
+    return [InputData(**record) for record in records]
+
+def score_batch(items: List[InputData]) -> List[dict]:
+    version, model = model_store.predictor(len(items))
+    input_df = to_model_frame(items)
+    with stage("api", "predict", rows=len(input_df)):
+        predictions = prediction_cache.predict(
+            model, version, input_df, lambda frame: timed_predict("api", model, frame))
+    with stage("api", "advice"):
+        feedback = batch_feedback(input_df, predictions)
+    return [
+        {"predicted_score": round(float(p), 2), "feedback": advice}
+        for p, advice in zip(predictions, feedback)
+    ]
+
+def predict_single(data: InputData) -> dict:
+    input_dict = data.dict()
+
+    # Rename keys to match model expected columns
+    input_dict['Attendance (%)'] = input_dict.pop('Attendance')
+    input_dict['Stress_Level (1-10)'] = input_dict.pop('Stress_Level')
+
+    try:
+        version, model = model_store.predictor(1)
+        with stage("api", "predict", rows=1):
+            if isinstance(model, CompiledPipeline):
+                # Scored straight from the dict; cheaper than hashing the row
+                # for the prediction cache
+                prediction = float(timed_predict("api", model, [input_dict])[0])
+            else:
+                input_df = pd.DataFrame([input_dict])
+                prediction = prediction_cache.predict(
+                    model, version, input_df, lambda frame: timed_predict("api", model, frame))[0]
+    except Exception as e:
+        return {"error": f"Prediction error: {str(e)}"}
+
+    advice = ADVICE_RULES.tips_for({**input_dict, "Predicted_Score": prediction})
+
+    return {
+        "predicted_score": round(prediction, 2),
+        "feedback": advice
+    }
+
+# Optional micro-batching of concurrent /predict calls, e.g.
+# PREDICT_MICROBATCH=1 PREDICT_BATCH_WINDOW_MS=5 PREDICT_BATCH_SIZE=64
+batcher = None
+if os.environ.get("PREDICT_MICROBATCH", "0") == "1":
+    batcher = MicroBatcher(
+        score_batch,
+        max_batch_size=int(os.environ.get("PREDICT_BATCH_SIZE", "64")),
+        max_wait_ms=float(os.environ.get("PREDICT_BATCH_WINDOW_MS", "5")),
+    )
+    print(f"✅ Micro-batching enabled ({batcher.max_batch_size} requests / {batcher.max_wait * 1000:g} ms).")
+
+@app.post("/predict")
+async def predict(data: InputData):
+    if not model_store.ready():
+        return {"error": "Model not loaded."}
+
+    if batcher is None:
+        return await run_in_threadpool(predict_single, data)
+
+    try:
+        return await batcher.submit(data)
+    except Exception as e:
+        return {"error": f"Prediction error: {str(e)}"}
+
+@app.get("/model/info")
+def model_info():
+    return {**model_store.info(), "prediction_cache": prediction_cache.stats()}
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    if not model_store.ready():
+        return {"error": "Model not loaded."}
+
+    body = await request.body()
+    try:
+        with stage("api", "parse"):
+            items = parse_batch(body, request.headers.get("content-type", ""))
+    except (ValueError, TypeError, ValidationError) as e:
+        return {"error": f"Invalid batch: {str(e)}"}
+
+    if not items:
+        return {"predictions": [], "count": 0}
+
+    try:
+        # One vectorized predict for the whole batch, off the event loop
+        results = await run_in_threadpool(score_batch, items)
+    except Exception as e:
+        return {"error": f"Prediction error: {str(e)}"}
+
+    return {"predictions": results, "count": len(results)}
+
+# Numeric inputs a sweep may vary; whole-number fields are swept in whole steps
+SWEEP_FEATURES = {name: kind for name, kind in InputData.__annotations__.items() if kind in (int, float)}
+SWEEP_MAX_POINTS = int(os.environ.get("SWEEP_MAX_POINTS", "10000"))
+
+class SweepAxis(BaseModel):
+    feature: str
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    steps: int = 21
+    values: Optional[List[float]] = None  # explicit values instead of start/stop/steps
+
+class SweepRequest(BaseModel):
+    base: InputData
+    vary: List[SweepAxis]
+    threshold: float = AT_RISK_SCORE
+
+def axis_values(axis: SweepAxis) -> np.ndarray:
+    if axis.feature not in SWEEP_FEATURES:
+        raise ValueError(f"Cannot vary '{axis.feature}'; choose from {', '.join(SWEEP_FEATURES)}.")
+    if axis.values is not None:
+        values = np.asarray(axis.values, dtype=float)
+    elif axis.start is not None and axis.stop is not None and axis.steps >= 2:
+        values = np.linspace(axis.start, axis.stop, axis.steps)
+    else:
+        raise ValueError(f"'{axis.feature}' needs values or start, stop and steps >= 2.")
+    if SWEEP_FEATURES[axis.feature] is int:
+        values = np.round(values)
+    values = np.unique(values)
+    if len(values) == 0:
+        raise ValueError(f"'{axis.feature}' has no values.")
+    return values
+
+def smallest_lift(axes: List[tuple], grid: np.ndarray, scores: np.ndarray, base: dict, threshold: float):
+    # The grid point reaching the threshold with the least change from the
+    # base inputs. Changes are measured as a fraction of each axis' range,
+    # so two features in different units are comparable; ties go to the
+    # higher score.
+    reaching = np.flatnonzero(scores >= threshold)
+    if len(reaching) == 0:
+        return None
+    cost = np.zeros(len(reaching))
+    for i, (feature, values) in enumerate(axes):
+        span = (values.max() - values.min()) or 1.0
+        cost += np.abs(grid[reaching, i] - base[feature]) / span
+    best = reaching[np.lexsort((-scores[reaching], cost))[0]]
+    return {
+        "predicted_score": round(float(scores[best]), 2),
+        "changes": {
+            feature: {"from": base[feature], "to": float(grid[best, i]),
+                      "delta": round(float(grid[best, i] - base[feature]), 4)}
+            for i, (feature, _) in enumerate(axes)
+            if grid[best, i] != base[feature]
+        },
+    }
+
+def run_sweep(request: SweepRequest) -> dict:
+    base = request.base.dict()
+    axes = [(axis.feature, axis_values(axis)) for axis in request.vary]
+    shape = tuple(len(values) for _, values in axes)
+    points = int(np.prod(shape))
+    if points > SWEEP_MAX_POINTS:
+        raise ValueError(f"Sweep has {points} points; the limit is {SWEEP_MAX_POINTS}.")
+
+    # Every grid point plus the unchanged base as the last row, scored in one predict
+    grid = np.stack([g.ravel() for g in np.meshgrid(*(values for _, values in axes), indexing="ij")], axis=1)
+    columns = {name: np.full(points + 1, value, dtype=object) for name, value in base.items()}
+    for i, (feature, _) in enumerate(axes):
+        columns[feature] = np.append(grid[:, i], base[feature])
+    frame = pd.DataFrame(columns).rename(columns=COLUMN_RENAMES)
+    for name, kind in SWEEP_FEATURES.items():
+        frame[COLUMN_RENAMES.get(name, name)] = frame[COLUMN_RENAMES.get(name, name)].astype(kind)
+
+    version, model = model_store.predictor(len(frame))
+    with stage("api", "predict", rows=len(frame)):
+        scores = prediction_cache.predict(
+            model, version, frame, lambda rows: timed_predict("api", model, rows))
+    base_score, scores = float(scores[-1]), scores[:-1]
+
+    if base_score >= request.threshold:
+        lift = {"predicted_score": round(base_score, 2), "changes": {}}
+    else:
+        lift = smallest_lift(axes, grid, scores, base, request.threshold)
+    return {
+        "base_predicted_score": round(base_score, 2),
+        "threshold": request.threshold,
+        "axes": [{"feature": feature, "values": values.tolist()} for feature, values in axes],
+        # Nested [i][j] for two axes, a flat curve for one
+        "predicted_scores": np.round(scores, 2).reshape(shape).tolist(),
+        "smallest_lift": lift,
+    }
+
+@app.post("/predict/sweep")
+async def predict_sweep(request: SweepRequest):
+    # What-if curve (one feature) or surface (two) around a student's inputs
+    if not model_store.ready():
+        return {"error": "Model not loaded."}
+    if not 1 <= len(request.vary) <= 2 or len({axis.feature for axis in request.vary}) != len(request.vary):
+        return {"error": "Invalid sweep: vary one or two distinct features."}
+    try:
+        return await run_in_threadpool(run_sweep, request)
+    except ValueError as e:
+        return {"error": f"Invalid sweep: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Prediction error: {str(e)}"}
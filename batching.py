@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Callable, List
+
+from fastapi.concurrency import run_in_threadpool
+
+
+class MicroBatcher:
+    """Collects concurrent single requests and scores them together.
+
+    Callers ``await submit(item)``. Items wait in a queue until either
+    ``max_batch_size`` of them have arrived or ``max_wait_ms`` has passed
+    since the first one, then ``score_fn`` runs once over the whole batch in
+    a worker thread and every caller receives its own result.
+    """
+
+    def __init__(self, score_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.score_fn = score_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    def _ensure_started(self):
+        # Bind to the running loop lazily; restart if the app moved loops
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Skip callers that gave up while waiting
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                results = await run_in_threadpool(self.score_fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,98 @@
+"""Check the compiled model against the sklearn pipeline and time both.
+
+Fails (exit 1) if any prediction differs from ``pipeline.predict``. Uses
+student_performance_pipeline.joblib when present, otherwise a stand-in:
+
+    python benchmarks/bench_compiled_model.py --rows 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from compiled_model import CompiledPipeline, compile_pipeline  # noqa: E402
+from model_store import MODEL_PATH  # noqa: E402
+from synthetic import make_stand_in_model, make_students  # noqa: E402
+
+
+def check(name: str, expected: np.ndarray, actual: np.ndarray, tolerance: float) -> bool:
+    diff = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    ok = diff <= tolerance
+    print(f"{'✅' if ok else '❌'} {name:<28} max |diff| {diff:.3g}")
+    return ok
+
+
+def per_call_ms(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=os.path.join(REPO_DIR, MODEL_PATH))
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=300, help="single-row predictions to time")
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    if os.path.exists(args.model):
+        pipeline = joblib.load(args.model)
+    else:
+        print("Model artifact not found; training a stand-in model.")
+        pipeline = make_stand_in_model(os.path.join(tempfile.mkdtemp(), MODEL_PATH))
+    compiled = compile_pipeline(pipeline)
+
+    frame = make_students(args.rows, seed=7)[list(pipeline.feature_names_in_)]
+    # Unseen categories are encoded as all zeros by both implementations
+    warnings.filterwarnings("ignore", message="Found unknown categories")
+    frame.loc[frame.index[:10], "Department"] = "Architecture"
+    frame.loc[frame.index[5:15], "Grade"] = "E"
+    expected = pipeline.predict(frame)
+
+    records = frame.to_dict("records")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.compiled")
+        compiled.save(path)
+        reloaded = CompiledPipeline.load(path, mmap_mode="r")
+        ok_reloaded = check("saved and mapped", expected, reloaded.predict(frame), args.tolerance)
+
+    ok = all([
+        check("predict(DataFrame)", expected, compiled.predict(frame), args.tolerance),
+        check("predict_records(dicts)", expected, compiled.predict_records(records), args.tolerance),
+        check("predict_array(ndarray)", expected,
+              compiled.predict_array(frame.to_numpy(), list(frame.columns)), args.tolerance),
+        ok_reloaded,
+        check("single rows", expected[:100],
+              np.array([compiled.predict_one(record) for record in records[:100]]), args.tolerance),
+    ])
+
+    record = records[0]
+    sklearn_ms = per_call_ms(lambda: pipeline.predict(pd.DataFrame([record])), args.calls)
+    compiled_ms = per_call_ms(lambda: compiled.predict_one(record), args.calls)
+    print(f"single row      sklearn {sklearn_ms:8.3f} ms   compiled {compiled_ms:8.3f} ms   "
+          f"{sklearn_ms / compiled_ms:6.1f}x")
+    for rows in (10, 100, 1000, args.rows):
+        batch = frame.iloc[:rows]
+        calls = max(1, 2000 // rows)
+        sklearn_ms = per_call_ms(lambda: pipeline.predict(batch), calls)
+        compiled_ms = per_call_ms(lambda: compiled.predict(batch), calls)
+        print(f"{rows:>7} rows    sklearn {sklearn_ms:8.3f} ms   compiled {compiled_ms:8.3f} ms   "
+              f"{sklearn_ms / compiled_ms:6.1f}x")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare rows/sec of the single-row /predict path against /predict/batch.
+
+Run from the directory holding student_performance_pipeline.joblib:
+
+    python benchmarks/bench_predict_batch.py --rows 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402
+
+
+def make_payload(rng: random.Random) -> dict:
+    return {
+        "Age": rng.randint(18, 24),
+        "Quizzes_Avg": rng.uniform(40, 100),
+        "Final_Score": rng.uniform(40, 100),
+        "Study_Hours_per_Week": rng.uniform(2, 30),
+        "Stress_Level": rng.randint(1, 10),
+        "Projects_Score": rng.uniform(40, 100),
+        "Participation_Score": rng.uniform(0, 10),
+        "Sleep_Hours_per_Night": rng.uniform(4, 9),
+        "Attendance": rng.uniform(50, 100),
+        "Midterm_Score": rng.uniform(40, 100),
+        "Assignments_Avg": rng.uniform(40, 100),
+        "Gender": rng.choice(["Male", "Female"]),
+        "Department": rng.choice(["Computer Science", "Business", "Engineering", "Education"]),
+        "Extracurricular_Activities": rng.choice(["Yes", "No"]),
+        "Internet_Access_at_Home": rng.choice(["Yes", "No"]),
+        "Parent_Education_Level": rng.choice(["High School", "Bachelor's", "Master's", "PhD"]),
+        "Family_Income_Level": rng.choice(["Low", "Medium", "High"]),
+        "Grade": rng.choice(["A", "B", "C", "D", "F"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--single-rows", type=int, default=200,
+                        help="rows sent through /predict one request at a time")
+    args = parser.parse_args()
+
+    if not api.model_store.ready():
+        sys.exit("Model not loaded; run from the directory holding the joblib artifact.")
+
+    rng = random.Random(42)
+    payloads = [make_payload(rng) for _ in range(args.rows)]
+    client = TestClient(api.app)
+
+    single = payloads[:args.single_rows]
+    start = time.perf_counter()
+    single_results = [client.post("/predict", json=p).json() for p in single]
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_results = client.post("/predict/batch", json=payloads).json()["predictions"]
+    batch_elapsed = time.perf_counter() - start
+
+    # Both paths must agree on the overlapping rows
+    for one, many in zip(single_results, batch_results):
+        assert one["predicted_score"] == many["predicted_score"], (one, many)
+        assert one["feedback"] == many["feedback"], (one, many)
+
+    single_rate = len(single) / single_elapsed
+    batch_rate = len(payloads) / batch_elapsed
+    print(f"/predict        {len(single):>7} rows  {single_elapsed:8.3f}s  {single_rate:10.1f} rows/s")
+    print(f"/predict/batch  {len(payloads):>7} rows  {batch_elapsed:8.3f}s  {batch_rate:10.1f} rows/s")
+    print(f"speedup         {batch_rate / single_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare two benchmark result files from benchmarks/run_suite.py.
+
+    python benchmarks/compare.py baseline.json candidate.json --threshold 0.15
+
+Exits with status 1 if any endpoint's p95 latency or throughput regressed by
+more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import Tuple
+
+
+def load(path: str) -> Tuple[dict, dict]:
+    # ({(endpoint, scale): result}, full report)
+    with open(path) as f:
+        report = json.load(f)
+    return {(r["endpoint"], r["scale"]): r for r in report["results"]}, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change counted as a regression (default 0.10)")
+    args = parser.parse_args()
+
+    base, base_report = load(args.baseline)
+    cand, cand_report = load(args.candidate)
+    if base_report.get("model") != cand_report.get("model"):
+        print(f"Warning: models differ ({base_report.get('model')} vs {cand_report.get('model')}).")
+
+    print(f"{base_report['commit']} -> {cand_report['commit']}")
+    print(f"{'endpoint':<52} {'scale':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'rss':>8}")
+    regressions = []
+    for key in sorted(base.keys() & cand.keys(), key=lambda k: (k[0], str(k[1]))):
+        old, new = base[key], cand[key]
+        changes = {
+            "p50": new["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0,
+            "p95": new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0,
+            "p99": new["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0,
+            "req/s": new["requests_per_s"] / old["requests_per_s"] - 1 if old["requests_per_s"] else 0.0,
+        }
+        rss = (new["peak_rss_mb"] or 0) - (old["peak_rss_mb"] or 0)
+        print(f"{key[0]:<52} {str(key[1] or '-'):>5} "
+              + " ".join(f"{changes[name]:>+8.1%}" for name in ("p50", "p95", "p99", "req/s"))
+              + f" {rss:>+7.1f}M")
+        if changes["p95"] > args.threshold or changes["req/s"] < -args.threshold:
+            regressions.append(key)
+
+    for key in sorted(base.keys() ^ cand.keys(), key=lambda k: (k[0], str(k[1]))):
+        print(f"{key[0]:<52} {str(key[1] or '-'):>5} only in {'baseline' if key in base else 'candidate'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for endpoint, scale in regressions:
+            print(f"  {endpoint} [{scale or '-'}]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Throughput, latency percentiles and peak RSS for every service endpoint.
+
+All services are exercised in process through the gateway app, against
+synthetic data at each requested scale, first one request at a time and
+then from ``--concurrency`` clients at once. Results are written as JSON so runs
+from different commits can be compared with benchmarks/compare.py:
+
+    python benchmarks/run_suite.py --scales 1k,100k
+    python benchmarks/compare.py benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+Uses student_performance_pipeline.joblib from the repo root when present,
+otherwise a small stand-in model (recorded in the results).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from model_store import MODEL_PATH, resident_mb  # noqa: E402
+from synthetic import SCALES, make_marks, make_stand_in_model, write_students  # noqa: E402
+
+
+class PeakRSS:
+    """Samples this process's RSS in the background while the block runs."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = resident_mb()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline = resident_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def measure(endpoint: str, scale, call, requests: int, rows_per_request: int = 1, clients: int = 1) -> dict:
+    # ``call(i)`` sends one request and returns the response; with
+    # ``clients`` > 1 that many threads send the requests concurrently
+    def timed(i):
+        t0 = time.perf_counter()
+        response = call(i)
+        latency = time.perf_counter() - t0
+        if response.status_code >= 400:
+            raise RuntimeError(f"{endpoint} returned {response.status_code}: {response.text[:200]}")
+        return latency
+
+    if clients > 1:
+        endpoint = f"{endpoint} [{clients} clients]"
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        if clients > 1:
+            with ThreadPoolExecutor(clients) as pool:
+                latencies = list(pool.map(timed, range(requests)))
+        else:
+            latencies = [timed(i) for i in range(requests)]
+        elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    result = {
+        "endpoint": endpoint,
+        "scale": scale,
+        "requests": requests,
+        "clients": clients,
+        "rows_per_request": rows_per_request,
+        "seconds": round(elapsed, 4),
+        "requests_per_s": round(requests / elapsed, 2),
+        "rows_per_s": round(requests * rows_per_request / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "peak_rss_mb": rss.peak,
+        "rss_growth_mb": round(rss.peak - rss.baseline, 1) if rss.peak and rss.baseline else None,
+    }
+    print(f"{endpoint:<52} {str(scale or '-'):>5} {requests:>6} req "
+          f"{result['requests_per_s']:>10.1f} req/s  p50 {result['p50_ms']:>9.2f}  "
+          f"p95 {result['p95_ms']:>9.2f}  p99 {result['p99_ms']:>9.2f} ms  "
+          f"peak {result['peak_rss_mb']} MB")
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def bench_scale(client, scale: str, args) -> list:
+    rows = SCALES[scale]
+    path = f"students_{scale}.csv"
+    write_students(path, rows)
+    with open(path, "rb") as f:
+        content = f.read()
+    upload_repeats = args.upload_repeats if rows < 1_000_000 else 1
+    rng = random.Random(42)
+    results = []
+
+    results.append(measure(
+        "POST /upload-data/", scale,
+        lambda i: client.post("/upload-data/", files={"file": (path, content, "text/csv")}),
+        upload_repeats, rows,
+    ))
+
+    # Full-table responses are only sensible up to 100k rows
+    if rows <= 100_000:
+        results.append(measure(
+            "GET /dashboard/charts-data", scale,
+            lambda i: client.get("/dashboard/charts-data"),
+            min(args.requests, 20), rows,
+        ))
+    offsets = [rng.randrange(0, max(1, rows - 1000)) for _ in range(args.requests)]
+    results.append(measure(
+        "GET /dashboard/charts-data?limit=1000", scale,
+        lambda i: client.get("/dashboard/charts-data", params={"offset": offsets[i], "limit": 1000}),
+        args.requests, 1000,
+    ))
+    bins = [rng.randint(5, 50) for _ in range(args.requests)]
+    results.append(measure(
+        "GET /dashboard/charts-data?aggregate=histogram", scale,
+        lambda i: client.get("/dashboard/charts-data",
+                             params={"aggregate": "histogram", "column": "Final_Score", "bins": bins[i]}),
+        args.requests,
+    ))
+
+    results.append(measure(
+        "POST /student/insights", scale,
+        lambda i: client.post("/student/insights", files={"file": (path, content, "text/csv")}),
+        upload_repeats, rows,
+    ))
+    ids = [f"S{1000 + rng.randrange(rows)}" for _ in range(args.requests)]
+    results.append(measure(
+        "GET /student-insights/{id}", scale,
+        lambda i: client.get(f"/student-insights/{ids[i]}"),
+        args.requests,
+    ))
+
+    # The same reads from concurrent clients
+    if args.concurrency > 1:
+        results.append(measure(
+            "GET /dashboard/charts-data?limit=1000", scale,
+            lambda i: client.get("/dashboard/charts-data", params={"offset": offsets[i], "limit": 1000}),
+            args.requests, 1000, clients=args.concurrency,
+        ))
+        results.append(measure(
+            "GET /student-insights/{id}", scale,
+            lambda i: client.get(f"/student-insights/{ids[i]}"),
+            args.requests, clients=args.concurrency,
+        ))
+
+    os.remove(path)
+    return results
+
+
+def bench_fixed(client, args) -> list:
+    # Endpoints whose cost does not depend on the uploaded dataset
+    from bench_predict_batch import make_payload
+
+    rng = random.Random(42)
+    payloads = [make_payload(rng) for _ in range(args.requests)]
+    batch = [make_payload(rng) for _ in range(1000)]
+    marks = []
+    for i in range(args.requests):
+        buffer = make_marks(50, seed=i).to_csv(index=False).encode()
+        marks.append((f"2024{i % 10:05d}", buffer))
+
+    predict = lambda i: client.post("/predict", json=payloads[i])  # noqa: E731
+    results = [
+        measure("POST /predict", None, predict, args.requests),
+        measure("POST /predict/batch", None, lambda i: client.post("/predict/batch", json=batch),
+                max(1, args.requests // 20), len(batch)),
+        measure("POST /upload_student_marks/", None,
+                lambda i: client.post("/upload_student_marks/",
+                                      data={"student_number": marks[i][0]},
+                                      files={"file": ("marks.csv", marks[i][1], "text/csv")}),
+                args.requests, 50),
+    ]
+    if args.concurrency > 1:
+        results.append(measure("POST /predict", None, predict, args.requests, clients=args.concurrency))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1k", help="comma-separated: " + ", ".join(SCALES))
+    parser.add_argument("--requests", type=int, default=200, help="requests per small-request endpoint")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="clients for the concurrent scenarios (1 skips them)")
+    parser.add_argument("--upload-repeats", type=int, default=3, help="uploads per scale (1 at 1M rows)")
+    parser.add_argument("--model", default=os.path.join(REPO_DIR, MODEL_PATH),
+                        help="model artifact; a stand-in is trained if it does not exist")
+    parser.add_argument("--out", help="results file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        sys.exit(f"Unknown scales: {', '.join(unknown)}")
+    out = os.path.abspath(args.out or os.path.join(BENCH_DIR, "results", f"{git_commit()}.json"))
+
+    # Services write datasets, jobs and marks relative to the working
+    # directory; keep them out of the repo
+    workdir = tempfile.mkdtemp(prefix="capstone-bench-")
+    os.chdir(workdir)
+    os.environ.setdefault("JOB_EXECUTOR", "thread")  # keep job work visible to the RSS sampler
+    if os.path.exists(args.model):
+        shutil.copy(args.model, MODEL_PATH)
+        model_kind = "artifact"
+    else:
+        print("Model artifact not found; training a stand-in model.")
+        make_stand_in_model(MODEL_PATH)
+        model_kind = "stand-in"
+
+    try:
+        from fastapi.testclient import TestClient
+        import gateway
+
+        start = time.perf_counter()
+        while not gateway.model_store.loaded:
+            if time.perf_counter() - start > 120:
+                sys.exit("Model did not load.")
+            time.sleep(0.05)
+
+        results = []
+        with TestClient(gateway.app) as client:
+            results += bench_fixed(client, args)
+            for scale in scales:
+                results += bench_scale(client, scale, args)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model": model_kind,
+        "job_executor": os.environ["JOB_EXECUTOR"],
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
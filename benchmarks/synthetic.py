@@ -0,0 +1,114 @@
+"""Synthetic student data and a stand-in model for the benchmarks.
+
+    python benchmarks/synthetic.py --rows 100000 --out students_100k.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from train import DROP_COLS, TARGET_COL, build_pipeline, numeric_columns  # noqa: E402
+
+# Same order as upload.REQUIRED_COLUMNS, which the upload endpoint checks strictly
+STUDENT_COLUMNS = [
+    "Student_ID", "First_Name", "Last_Name", "Email", "Gender", "Age",
+    "Department", "Attendance (%)", "Midterm_Score", "Final_Score",
+    "Assignments_Avg", "Quizzes_Avg", "Participation_Score", "Projects_Score",
+    "Total_Score", "Grade", "Study_Hours_per_Week", "Extracurricular_Activities",
+    "Internet_Access_at_Home", "Parent_Education_Level", "Family_Income_Level",
+    "Stress_Level (1-10)", "Sleep_Hours_per_Night", "Total_Score_Recalculated"
+]
+
+DEPARTMENTS = ["Computer Science", "Business", "Engineering", "Education"]
+SCALES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+
+def make_students(rows: int, seed: int = 42, start_id: int = 1000) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ids = np.arange(start_id, start_id + rows).astype(str)
+    scores = {col: rng.uniform(30, 100, rows).round(2) for col in
+              ["Midterm_Score", "Final_Score", "Assignments_Avg", "Quizzes_Avg", "Projects_Score"]}
+    study = rng.uniform(2, 30, rows).round(1)
+    total = np.mean(np.vstack(list(scores.values())), axis=0)
+
+    df = pd.DataFrame({
+        "Student_ID": np.char.add("S", ids),
+        "First_Name": rng.choice(["Ama", "Tendai", "Lerato", "Sipho", "Nia", "Kofi"], rows),
+        "Last_Name": rng.choice(["Moyo", "Dube", "Ncube", "Banda", "Phiri", "Sibanda"], rows),
+        "Email": np.char.add(np.char.add("s", ids), "@example.edu"),
+        "Gender": rng.choice(["Male", "Female"], rows),
+        "Age": rng.integers(18, 25, rows),
+        "Department": rng.choice(DEPARTMENTS, rows),
+        "Attendance (%)": rng.uniform(50, 100, rows).round(2),
+        "Participation_Score": rng.uniform(0, 10, rows).round(2),
+        "Total_Score": total.round(2),
+        "Grade": rng.choice(list("ABCDF"), rows),
+        "Study_Hours_per_Week": study,
+        "Extracurricular_Activities": rng.choice(["Yes", "No"], rows),
+        "Internet_Access_at_Home": rng.choice(["Yes", "No"], rows),
+        "Parent_Education_Level": rng.choice(["High School", "Bachelor's", "Master's", "PhD"], rows),
+        "Family_Income_Level": rng.choice(["Low", "Medium", "High"], rows),
+        "Stress_Level (1-10)": rng.integers(1, 11, rows),
+        "Sleep_Hours_per_Night": rng.uniform(4, 9, rows).round(1),
+        "Total_Score_Recalculated": (total - 10 + study / 3).round(2),
+        **scores,
+    })
+    return df[STUDENT_COLUMNS]
+
+
+def write_students(path: str, rows: int, seed: int = 42, chunk_rows: int = 100_000):
+    # Written in chunks so the 1M-row file never needs the whole frame in memory
+    with open(path, "w", newline="") as f:
+        for n, start in enumerate(range(0, rows, chunk_rows)):
+            chunk = make_students(min(chunk_rows, rows - start), seed=seed + n, start_id=1000 + start)
+            chunk.to_csv(f, index=False, header=(start == 0))
+
+
+def make_marks(rows: int, seed: int = 42, modules: int = 4) -> pd.DataFrame:
+    # One student's marks upload (see student.upload_student_marks)
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Full Name": "Ama Moyo",
+        "Module Name": rng.choice([f"MOD{i:02d}" for i in range(modules)], rows),
+        "Type": rng.choice(["Test", "Quizz", "Assignment"], rows),
+        "Number": rng.integers(1, 20, rows),
+        "Score": rng.uniform(20, 100, rows).round(1),
+    })
+
+
+def make_stand_in_model(path: str, rows: int = 2000, seed: int = 42):
+    # Small forest with the real pipeline's preprocessing, for machines
+    # without the trained artifact; latencies are not comparable to it
+    import joblib
+
+    data = make_students(rows, seed=seed)
+    X = data.drop(columns=DROP_COLS)
+    pipeline = build_pipeline(numeric_columns(X))
+    pipeline.set_params(regressor__n_estimators=10, regressor__max_depth=8, regressor__n_jobs=1)
+    pipeline.fit(X, data[TARGET_COL])
+    joblib.dump(pipeline, path)
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1k", help="row count or one of " + ", ".join(SCALES))
+    parser.add_argument("--out", default="students.csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--model", help="also write a stand-in model to this path")
+    args = parser.parse_args()
+
+    rows = SCALES.get(args.rows) or int(args.rows)
+    write_students(args.out, rows, seed=args.seed)
+    print(f"Wrote {rows} rows to {args.out}")
+    if args.model:
+        make_stand_in_model(args.model, seed=args.seed)
+        print(f"Wrote stand-in model to {args.model}")
+
+
+if __name__ == "__main__":
+    main()
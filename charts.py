@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from fastapi.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is used when orjson is missing
+    orjson = None
+
+DEFAULT_BINS = 10
+MAX_BINS = 200
+
+# Bodies at least this large are served gzip-encoded to clients that accept
+# it (same cut-off as upload.py's GZipMiddleware)
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+CHARTS_PATH = "/dashboard/charts-data"
+
+
+def encode_json(content) -> bytes:
+    if orjson is not None:
+        # orjson writes NaN as null, so no where(notnull) copy is needed
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_nan_to_none(content), allow_nan=False).encode()
+
+
+def _nan_to_none(value):
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, dict):
+        return {k: _nan_to_none(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_nan_to_none(v) for v in value]
+    return value
+
+
+def etag_for(version: str, params: dict) -> str:
+    # Weak validator: same upload version + same query -> same representation
+    query = json.dumps(params, sort_keys=True, default=str)
+    digest = hashlib.sha1(query.encode()).hexdigest()[:12]
+    return f'W/"{version}-{digest}"'
+
+
+_ENTITY_TAG = re.compile(r'\s*(?:W/)?"([^"]*)"\s*(?:,|$)')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match per RFC 9110 section 13.1.2: "*" or a comma-separated
+    # list of entity tags, compared weakly (a W/ prefix on either side is ignored)
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _ENTITY_TAG.match(etag).group(1)
+    return opaque in _ENTITY_TAG.findall(if_none_match)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    # Accept-Encoding lists gzip (or *) without q=0
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.replace(" ", "").lower()
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def gzip_body(body: bytes) -> bytes:
+    # mtime=0 keeps the encoding identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class ChartsGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves charts-data alone; it caches and serves
+    its own gzip-encoded bodies instead of having them recompressed."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].rstrip("/") == CHARTS_PATH:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class ResponseCache:
+    """LRU of encoded response bodies bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return  # would evict everything else
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._entries[key] = body
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+
+def records(df: pd.DataFrame) -> list:
+    return df.to_dict(orient="records")
+
+
+def histogram(df: pd.DataFrame, column: str, bins: int = DEFAULT_BINS) -> dict:
+    values = pd.to_numeric(df[column], errors="coerce").dropna().to_numpy(dtype="float64")
+    if values.size == 0:
+        return {"column": column, "edges": [], "counts": []}
+    counts, edges = np.histogram(values, bins=max(1, min(bins, MAX_BINS)))
+    return {
+        "column": column,
+        "edges": [round(float(e), 4) for e in edges],
+        "counts": counts.tolist(),
+    }
+
+
+def group_means(df: pd.DataFrame, by: str, column: str) -> dict:
+    values = pd.to_numeric(df[column], errors="coerce").astype("float64")
+    means = values.groupby(df[by], observed=True).mean().round(2)
+    return {"by": by, "column": column, "means": {str(k): float(v) for k, v in means.items()}}
+
+
+def value_counts(df: pd.DataFrame, column: str) -> dict:
+    counts = df[column].value_counts(sort=False)
+    return {"column": column, "counts": {str(k): int(v) for k, v in counts.items() if v}}
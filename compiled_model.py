@@ -0,0 +1,281 @@
+"""Lightweight inference engine for the trained RandomForest pipeline.
+
+The fitted ``student_performance_pipeline.joblib`` is exported into flat
+NumPy arrays: one-hot lookup tables and scaler parameters for the
+preprocessing, and every tree of the forest concatenated into one node
+table. The tables are saved as ``.npy`` files in a directory next to the
+artifact (``ModelRegistry.register`` does this at train time) and loaded
+with ``mmap_mode="r"``, so every worker process maps the same page-cache
+copy instead of holding its own. Rows are scored straight from dicts or arrays without building a
+DataFrame or going through sklearn's input validation, which dominates the
+cost of single-row predictions. sklearn's compiled tree walk is still faster
+per row, so large batches should keep using the pipeline itself.
+
+    python compiled_model.py --model student_performance_pipeline.joblib --out student_performance_pipeline.compiled
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+BLOCK_ROWS = 8192  # rows walked through the forest at once; bounds temporary memory
+NODE_ARRAYS = ("left", "right", "feature", "threshold", "value", "missing_left")
+
+
+def compiled_path(model_path: str) -> str:
+    # Directory of .npy tables saved next to a joblib artifact
+    return os.path.splitext(model_path)[0] + ".compiled"
+
+
+class CompiledPipeline:
+    """Preprocessing plus forest, evaluated with vectorised NumPy.
+
+    Predictions match ``pipeline.predict`` for the same rows: features are
+    scaled in float64 and compared against the split thresholds as float32,
+    exactly as sklearn's trees do, and tree outputs are summed in estimator
+    order before averaging.
+    """
+
+    def __init__(self, categorical, numeric, feature_names, nodes, roots, max_depth):
+        # categorical: [(column, categories, output positions)]; a position of
+        # -1 marks the dropped category (all zeros, as are unknown values)
+        self.categorical = categorical
+        # numeric: [(column, mean, scale, output position)]
+        self.numeric = numeric
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.nodes = nodes
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features = sum(int((pos >= 0).sum()) for _, _, pos in categorical) + len(numeric)
+        self._lookups = [
+            (col, {cat: int(p) for cat, p in zip(cats, pos)}) for col, cats, pos in categorical
+        ]
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "CompiledPipeline":
+        # Supports the pipeline train.build_pipeline produces: a
+        # ColumnTransformer of OneHotEncoder and StandardScaler feeding a
+        # RandomForestRegressor. Anything else raises ValueError.
+        from sklearn.compose import ColumnTransformer
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+        preprocessor, forest = pipeline.steps[0][1], pipeline.steps[-1][1]
+        if len(pipeline.steps) != 2 or not isinstance(preprocessor, ColumnTransformer) \
+                or not isinstance(forest, RandomForestRegressor):
+            raise ValueError("Expected a ColumnTransformer followed by a RandomForestRegressor.")
+        if forest.n_outputs_ != 1:
+            raise ValueError("Only single-output forests are supported.")
+
+        categorical, numeric = [], []
+        position = 0
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == "remainder":
+                if transformer != "drop" and len(columns):
+                    raise ValueError("Passthrough remainder columns are not supported.")
+                continue
+            if transformer == "drop":
+                continue
+            if isinstance(transformer, OneHotEncoder):
+                if transformer.handle_unknown != "ignore" or getattr(transformer, "_infrequent_enabled", False):
+                    raise ValueError("OneHotEncoder must use handle_unknown='ignore' without infrequent categories.")
+                drop_idx = transformer.drop_idx_
+                for i, (col, cats) in enumerate(zip(columns, transformer.categories_)):
+                    dropped = None if drop_idx is None else drop_idx[i]
+                    pos = np.full(len(cats), -1, dtype=np.int64)
+                    for k in range(len(cats)):
+                        if k != dropped:
+                            pos[k] = position
+                            position += 1
+                    categorical.append((col, [c.item() if hasattr(c, "item") else c for c in cats], pos))
+            elif isinstance(transformer, StandardScaler):
+                means = transformer.mean_ if transformer.with_mean else np.zeros(len(columns))
+                scales = transformer.scale_ if transformer.with_std else np.ones(len(columns))
+                for col, mean, scale in zip(columns, means, scales):
+                    numeric.append((col, float(mean), float(scale), position))
+                    position += 1
+            else:
+                raise ValueError(f"Unsupported transformer {name!r}: {type(transformer).__name__}.")
+
+        if position != forest.n_features_in_:
+            raise ValueError(f"Preprocessing yields {position} features, the forest expects {forest.n_features_in_}.")
+
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        counts = np.array([tree.node_count for tree in trees])
+        roots = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        parts = {key: [] for key in NODE_ARRAYS}
+        for tree, offset in zip(trees, roots):
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            is_leaf = left == -1
+            own = np.arange(tree.node_count, dtype=np.int64)
+            # Leaves point at themselves and always "go left", so every row can
+            # take max_depth steps without checking whether it has arrived
+            parts["left"].append(np.where(is_leaf, own, left) + offset)
+            parts["right"].append(np.where(is_leaf, own, right) + offset)
+            parts["feature"].append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            parts["threshold"].append(np.where(is_leaf, np.inf, tree.threshold))
+            parts["value"].append(tree.value[:, 0, 0].astype(np.float64))
+            missing = getattr(tree, "missing_go_to_left", None)
+            missing = np.zeros(tree.node_count, dtype=bool) if missing is None else missing.astype(bool)
+            parts["missing_left"].append(missing | is_leaf)
+        nodes = {key: np.concatenate(values) for key, values in parts.items()}
+
+        feature_names = getattr(pipeline, "feature_names_in_", None)
+        if feature_names is None:
+            feature_names = [col for col, _, _ in categorical] + [col for col, _, _, _ in numeric]
+        max_depth = int(max(tree.max_depth for tree in trees))
+        return cls(categorical, numeric, list(feature_names), nodes, roots, max_depth)
+
+    def save(self, path: str, **extra_meta):
+        # One .npy per array plus meta.json, written to a temporary directory
+        # and renamed into place. extra_meta is stored alongside, e.g. which
+        # artifact the tables were built from.
+        meta = {
+            "categorical": [(col, cats, pos.tolist()) for col, cats, pos in self.categorical],
+            "numeric": self.numeric,
+            "feature_names": self.feature_names_in_.tolist(),
+            "max_depth": self.max_depth,
+            **extra_meta,
+        }
+        tmp_dir = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir)
+        try:
+            for key, values in {"roots": self.roots, **self.nodes}.items():
+                np.save(os.path.join(tmp_dir, f"{key}.npy"), values)
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            if os.path.isdir(path):
+                # Processes that mapped the old files keep them until they reload
+                shutil.rmtree(path)
+            os.rename(tmp_dir, path)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def read_meta(path: str) -> dict:
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r") -> "CompiledPipeline":
+        # With mmap_mode the node tables stay in the page cache, shared by
+        # every process that loads the same files
+        meta = cls.read_meta(path)
+        if not meta:
+            raise ValueError(f"No compiled model at {path}.")
+
+        def array(key):
+            return np.asarray(np.load(os.path.join(path, f"{key}.npy"), mmap_mode=mmap_mode, allow_pickle=False))
+
+        nodes = {key: array(key) for key in NODE_ARRAYS}
+        roots = array("roots")
+        categorical = [(col, cats, np.asarray(pos, dtype=np.int64)) for col, cats, pos in meta["categorical"]]
+        numeric = [tuple(entry) for entry in meta["numeric"]]
+        return cls(categorical, numeric, meta["feature_names"], nodes, roots, meta["max_depth"])
+
+    @property
+    def input_columns(self) -> list:
+        return [col for col, _, _ in self.categorical] + [col for col, _, _, _ in self.numeric]
+
+    def _encode_records(self, records) -> np.ndarray:
+        X = np.zeros((len(records), self.n_features), dtype=np.float64)
+        for col, lookup in self._lookups:
+            for i, record in enumerate(records):
+                p = lookup.get(record[col], -1)
+                if p >= 0:
+                    X[i, p] = 1.0
+        for col, mean, scale, p in self.numeric:
+            values = np.array([record[col] for record in records], dtype=np.float64)
+            X[:, p] = (values - mean) / scale
+        return X
+
+    def _encode_columns(self, get_column, n_rows: int) -> np.ndarray:
+        import pandas as pd
+
+        X = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        rows = np.arange(n_rows)
+        for col, cats, pos in self.categorical:
+            codes = pd.Index(cats).get_indexer(np.asarray(get_column(col), dtype=object))
+            out = np.where(codes >= 0, pos[codes], -1)
+            hit = out >= 0
+            X[rows[hit], out[hit]] = 1.0
+        for col, mean, scale, p in self.numeric:
+            X[:, p] = (np.asarray(get_column(col), dtype=np.float64) - mean) / scale
+        return X
+
+    def _predict_features(self, X: np.ndarray) -> np.ndarray:
+        X = X.astype(np.float32)  # sklearn's trees split on float32 features
+        out = np.empty(len(X), dtype=np.float64)
+        nodes = self.nodes
+        check_missing = bool(np.isnan(X).any())
+        for start in range(0, len(X), BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            rows = np.arange(len(block))[:, None]
+            current = np.broadcast_to(self.roots, (len(block), len(self.roots))).copy()
+            for _ in range(self.max_depth):
+                x = block[rows, nodes["feature"][current]]
+                go_left = x <= nodes["threshold"][current]
+                if check_missing:
+                    go_left |= np.isnan(x) & nodes["missing_left"][current]
+                current = np.where(go_left, nodes["left"][current], nodes["right"][current])
+            leaves = nodes["value"][current]
+            total = np.zeros(len(block), dtype=np.float64)
+            for t in range(leaves.shape[1]):
+                total += leaves[:, t]
+            out[start:start + BLOCK_ROWS] = total / leaves.shape[1]
+        return out
+
+    def predict_records(self, records) -> np.ndarray:
+        # records: list of dicts keyed by the pipeline's input column names
+        if not records:
+            return np.empty(0, dtype=np.float64)
+        return self._predict_features(self._encode_records(records))
+
+    def predict_one(self, record: dict) -> float:
+        return float(self.predict_records([record])[0])
+
+    def predict_array(self, values, columns=None) -> np.ndarray:
+        # values: 2-D array of raw inputs, columns in ``columns`` order
+        # (``input_columns`` by default)
+        values = np.asarray(values, dtype=object)
+        if values.ndim != 2:
+            raise ValueError("Expected a 2-D array of rows.")
+        index = {col: i for i, col in enumerate(columns or self.input_columns)}
+        return self._predict_features(self._encode_columns(lambda col: values[:, index[col]], len(values)))
+
+    def predict(self, frame) -> np.ndarray:
+        # Drop-in for pipeline.predict on a DataFrame; also takes a list of
+        # record dicts
+        if isinstance(frame, list):
+            return self.predict_records(frame)
+        return self._predict_features(self._encode_columns(lambda col: frame[col].to_numpy(), len(frame)))
+
+
+def compile_pipeline(pipeline) -> CompiledPipeline:
+    return CompiledPipeline.from_pipeline(pipeline)
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export the trained pipeline as a compiled model.")
+    parser.add_argument("--model", default="student_performance_pipeline.joblib")
+    parser.add_argument("--out", help="output directory (default: next to --model)")
+    args = parser.parse_args()
+    args.out = args.out or compiled_path(args.model)
+
+    compiled = compile_pipeline(joblib.load(args.model))
+    compiled.save(args.out)
+    print(f"✅ Compiled {len(compiled.roots)} trees ({len(compiled.nodes['value'])} nodes, "
+          f"depth {compiled.max_depth}) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import itertools
+import os
+import threading
+import shutil
+import time
+from typing import Callable, Iterable, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional; snapshots are shared as pickles without it
+    pa = None
+
+# Directory used to share published snapshots between worker processes;
+# set DATASET_DIR="" to keep snapshots in-process only
+DATASET_DIR = os.environ.get("DATASET_DIR", "datasets")
+
+_versions = itertools.count(1)
+
+
+def new_dataset_version() -> str:
+    # Unique per publish within a process and distinct across restarts/workers
+    return f"{int(time.time() * 1000):x}-{os.getpid():x}-{next(_versions)}"
+
+
+class Snapshot:
+    """One immutable published dataset.
+
+    ``frame`` must not be modified once published. ``derived`` holds data
+    computed once per version (aggregates, indexes) and ``cache`` is a
+    per-version scratch space for memoized responses.
+    """
+
+    __slots__ = ("version", "frame", "derived", "cache", "published_at")
+
+    def __init__(self, version: str, frame: pd.DataFrame, derived: dict):
+        self.version = version
+        self.frame = frame
+        self.derived = derived
+        self.cache = {}
+        self.published_at = time.time()
+
+
+class DatasetStore:
+    """Versioned dataset with lock-free reads.
+
+    Writers build a complete frame off to the side and ``publish`` it; the
+    new snapshot replaces the old one with a single reference swap, so a
+    reader holding ``current()`` never sees partial state. When ``shared_dir``
+    is set, every publish is also written as an Arrow IPC file plus a version
+    pointer, and other worker processes memory-map it on their next read.
+    ``publish_chunks`` writes a frame that arrives in chunks one Arrow file
+    per chunk, so the publisher never holds the whole frame.
+    """
+
+    def __init__(self, name: str, derive: Optional[Callable[[pd.DataFrame, str], dict]] = None,
+                 shared_dir: Optional[str] = DATASET_DIR):
+        self.name = name
+        self.derive = derive
+        self.shared_dir = shared_dir or None
+        self._snapshot = None
+        self._pointer_signature = None
+        self._write_lock = threading.Lock()
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    # --- publishing -----------------------------------------------------
+
+    def _build(self, frame: pd.DataFrame, version: str) -> Snapshot:
+        derived = self.derive(frame, version) if self.derive else {}
+        return Snapshot(version, frame, derived)
+
+    def publish(self, frame: pd.DataFrame) -> Snapshot:
+        version = new_dataset_version()
+        snapshot = self._build(frame, version)
+        with self._write_lock:
+            if self.shared_dir:
+                self._write_shared(frame, version)
+            self._snapshot = snapshot  # atomic swap; readers keep their old reference
+        return snapshot
+
+    def publish_shared(self, frame: pd.DataFrame) -> str:
+        # Publish from a helper process (e.g. a job worker) without keeping
+        # the frame here; serving processes load it on their next read
+        if not self.shared_dir:
+            raise RuntimeError(f"Dataset '{self.name}' has no shared directory.")
+        version = new_dataset_version()
+        with self._write_lock:
+            self._write_shared(frame, version)
+        return version
+
+    @property
+    def streams(self) -> bool:
+        # Whether publish_chunks can write chunk by chunk
+        return self.shared_dir is not None and pa is not None
+
+    def publish_chunks(self, chunks: Iterable[pd.DataFrame], load: bool = True) -> str:
+        # Writes each chunk to the shared directory as it arrives. With load,
+        # this process then reads the published frame back like any other
+        # reader (memory-mapped), otherwise it only flips the pointer.
+        if not self.streams:
+            raise RuntimeError(f"Dataset '{self.name}' cannot publish chunks without pyarrow and a shared directory.")
+        version = new_dataset_version()
+        # Parsing and scoring happen while the chunks are consumed, so the
+        # lock is only taken to publish the finished files
+        self._write_shared_parts(chunks, version)
+        with self._write_lock:
+            self._flip_pointer(version)
+            if load:
+                self._snapshot = self._build(self._read_shared(version), version)
+        return version
+
+    # --- reading --------------------------------------------------------
+
+    def current(self) -> Optional[Snapshot]:
+        if self.shared_dir:
+            self._refresh_from_shared()
+        return self._snapshot
+
+    # --- cross-process sharing -------------------------------------------
+
+    @property
+    def _pointer_path(self) -> str:
+        return os.path.join(self.shared_dir, f"{self.name}.current")
+
+    def _data_path(self, version: str) -> str:
+        suffix = "arrow" if pa is not None else "pkl"
+        return os.path.join(self.shared_dir, f"{self.name}-{version}.{suffix}")
+
+    def _parts_path(self, version: str) -> str:
+        return os.path.join(self.shared_dir, f"{self.name}-{version}.parts")
+
+    def _write_shared(self, frame: pd.DataFrame, version: str):
+        path = self._data_path(version)
+        tmp_path = path + ".tmp"
+        if pa is not None:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            with pa.OSFile(tmp_path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            frame.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        self._flip_pointer(version)
+
+    def _write_shared_parts(self, chunks: Iterable[pd.DataFrame], version: str):
+        # One Arrow file per chunk in a directory renamed into place when
+        # complete. Chunks may differ in dtypes (e.g. a later chunk with a
+        # missing value); readers promote them when concatenating.
+        path = self._parts_path(version)
+        tmp_path = path + ".tmp"
+        os.makedirs(tmp_path)
+        try:
+            for i, chunk in enumerate(chunks):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                with pa.OSFile(os.path.join(tmp_path, f"{i:06d}.arrow"), "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            os.rename(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def _flip_pointer(self, version: str):
+        # Flip the pointer last so readers only ever see complete files
+        pointer_tmp = self._pointer_path + f".{os.getpid()}.tmp"
+        with open(pointer_tmp, "w") as f:
+            f.write(version)
+        os.replace(pointer_tmp, self._pointer_path)
+        self._pointer_signature = self._stat_pointer()
+        self._remove_old_versions(keep=version)
+
+    def _remove_old_versions(self, keep: str):
+        # Unlinking is safe on POSIX even if another worker still maps the file
+        prefix = f"{self.name}-"
+        for name in os.listdir(self.shared_dir):
+            if name.startswith(prefix) and not name.endswith(".tmp") and keep not in name:
+                path = os.path.join(self.shared_dir, name)
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _stat_pointer(self):
+        try:
+            st = os.stat(self._pointer_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh_from_shared(self):
+        signature = self._stat_pointer()
+        if signature is None or signature == self._pointer_signature:
+            return
+        with self._write_lock:
+            if signature == self._pointer_signature:
+                return
+            try:
+                with open(self._pointer_path) as f:
+                    version = f.read().strip()
+                if self._snapshot is None or self._snapshot.version != version:
+                    frame = self._read_shared(version)
+                    self._snapshot = self._build(frame, version)
+                self._pointer_signature = signature
+            except (OSError, ValueError) as e:
+                # Pointer moved on while reading; retry on the next call
+                print(f"❌ Could not load shared dataset '{self.name}':", e)
+
+    def _read_shared(self, version: str) -> pd.DataFrame:
+        path = self._data_path(version)
+        if pa is None:
+            return pd.read_pickle(path)
+        parts = self._parts_path(version)
+        if os.path.isdir(parts):
+            tables = []
+            for name in sorted(os.listdir(parts)):
+                with pa.memory_map(os.path.join(parts, name), "r") as source:
+                    tables.append(pa.ipc.open_file(source).read_all())
+            if not tables:
+                return pd.DataFrame()
+            table = pa.concat_tables(tables, promote_options="permissive")
+        else:
+            with pa.memory_map(path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+        frame = table.to_pandas()
+        # Arrow list columns come back as ndarrays; restore plain lists
+        for field in table.schema:
+            if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+                frame[field.name] = [None if v is None else list(v) for v in frame[field.name]]
+        return frame
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_dataset_store(name: str, derive: Optional[Callable[[pd.DataFrame, str], dict]] = None) -> DatasetStore:
+    # One store per dataset name per process, shared by every service module
+    with _stores_lock:
+        store = _stores.get(name)
+        if store is None:
+            store = DatasetStore(name, derive=derive)
+            _stores[name] = store
+        return store
@@ -0,0 +1,84 @@
+import importlib
+import os
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
+
+# Services share one lazily loaded model; set before they import model_store
+os.environ.setdefault("MODEL_LAZY_LOAD", "1")
+
+from charts import ChartsGZipMiddleware, GZIP_MIN_BYTES
+from metrics import instrument
+from model_store import get_model_store
+
+# Service modules mounted by the gateway, in route-precedence order;
+# GATEWAY_SERVICES=upload,api limits the gateway to a subset
+SERVICES = ["upload", "individuals", "api", "student", "analytics"]
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["ETag"],
+)
+
+app.add_middleware(ChartsGZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
+
+def route_key(route) -> tuple:
+    return (route.path, tuple(sorted(route.methods or ())))
+
+
+def iter_api_routes(routes):
+    # Newer FastAPI keeps included routers as one entry wrapping the original
+    # APIRouter instead of copying their routes
+    for route in routes:
+        if isinstance(route, APIRoute):
+            yield route
+        elif hasattr(route, "original_router"):
+            yield from iter_api_routes(route.original_router.routes)
+
+
+def mount_service(gateway: FastAPI, module_name: str) -> list:
+    # Copies the service's routes onto the gateway. Routes another service
+    # already registered (e.g. /model/info, /jobs/*) are skipped: they are
+    # backed by the same per-process model/job/dataset registries anyway.
+    module = importlib.import_module(module_name)
+    existing = {route_key(route) for route in iter_api_routes(gateway.router.routes)}
+    mounted = []
+    for route in iter_api_routes(module.app.router.routes):
+        if route_key(route) in existing:
+            continue
+        gateway.router.routes.append(route)
+        existing.add(route_key(route))
+        mounted.append(route.path)
+    return mounted
+
+
+# Metrics cover every mounted route; registered first so the services'
+# own /metrics routes are skipped as duplicates
+instrument(app, "gateway")
+
+start = time.perf_counter()
+services = [name.strip() for name in os.environ.get("GATEWAY_SERVICES", ",".join(SERVICES)).split(",") if name.strip()]
+for name in services:
+    mount_service(app, name)
+print(f"✅ Gateway mounted {', '.join(services)} in {time.perf_counter() - start:.2f}s.")
+
+# Every service shares this one model store. The model (and sklearn with
+# it) loads in the background so the port opens immediately; requests
+# arriving before it finishes get the services' "Model not loaded." error
+model_store = get_model_store()
+threading.Thread(target=model_store.current, daemon=True).start()
+
+
+@app.get("/health")
+def health():
+    return {"services": services, "model": model_store.info()}
@@ -1,8 +1,20 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import pandas as pd
-import io
-import joblib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from aggregates import SKILL_COLUMNS, compute_aggregates
+from dataset_store import get_dataset_store
+from ingest import sniff_kind, spool_upload, read_columns, iter_chunks, concat_chunks, remove_quietly
+from jobs import FAILED, JobError, get_job_manager, in_job_worker, mp_context, router as jobs_router
+from metrics import cache_lookup, capture, instrument, replay, stage, timed_iter, timed_predict
+from model_store import get_model_store
+from prediction_cache import get_prediction_cache
+from rules import ROADMAP_RULES, compare_to_average
 
 app = FastAPI()
 
@@ -15,13 +27,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load the trained model
-try:
-    model = joblib.load("student_performance_pipeline.joblib")
-    print("✅ Model loaded for student insights.")
-except Exception as e:
-    print("❌ Failed to load model:", e)
-    model = None
+# Request latency/size metrics, stage timers and /metrics
+instrument(app, "individuals")
+
+# Shared, memory-mapped model that hot-reloads when the artifact is replaced
+model_store = get_model_store()
+
+# Re-uploaded rosters are served from the prediction cache
+prediction_cache = get_prediction_cache()
+
+# Uploads are scored in a worker pool, off the event loop
+jobs = get_job_manager()
+app.include_router(jobs_router)
 
 # Fixed module mapping per department
 department_modules = {
@@ -31,104 +48,260 @@ department_modules = {
     "Education": ["Curriculum", "Psychology", "Sociology", "Assessment", "Teaching Methods"]
 }
 
-# Global to hold uploaded student data
-uploaded_data = pd.DataFrame()
+def build_student_index(df: pd.DataFrame) -> dict:
+    # Student_ID (as str) -> row position; first occurrence wins, matching
+    # the previous first-match lookup
+    ids = df["Student_ID"].astype(str).tolist()
+    return {sid: pos for pos, sid in reversed(list(enumerate(ids)))}
 
-@app.post("/student/insights")
-async def student_insights(file: UploadFile = File(...)):
-    global uploaded_data
+def derive_insights(df: pd.DataFrame, version: str) -> dict:
+    # Class/top-decile statistics overall and per department, and the
+    # student index, once per upload
+    departments = {}
+    if "Department" in df.columns:
+        for dept, positions in df.groupby(df["Department"].astype(str), sort=False).indices.items():
+            departments[dept] = compute_aggregates(df.iloc[positions], version)
+    return {
+        "aggregates": compute_aggregates(df, version),
+        "departments": departments,
+        "student_index": build_student_index(df),
+    }
 
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded.")
+# Uploaded student data, published as immutable versioned snapshots
+dataset = get_dataset_store("insights", derive=derive_insights)
+
+# Required columns
+required_cols = [
+    "Student_ID", "First_Name", "Last_Name", "Department",
+    "Age", "Gender", "Study_Hours_per_Week", "Stress_Level (1-10)",
+    "Sleep_Hours_per_Night", "Participation_Score", "Projects_Score",
+    "Attendance (%)", "Midterm_Score", "Final_Score", "Quizzes_Avg", "Assignments_Avg",
+    "Grade", "Internet_Access_at_Home", "Extracurricular_Activities", 
+    "Parent_Education_Level", "Family_Income_Level"
+]
+
+# Departments are scored in parallel, PARTITION_WORKERS at a time. Threads
+# by default (the forest's predict releases the GIL); PARTITION_EXECUTOR=process
+# uses processes instead, started like the job pool's (jobs.JOB_START_METHOD).
+# The pool is kept for the life of the process, so each of its processes
+# loads the model once rather than once per upload
+PARTITION_WORKERS = int(os.environ.get("PARTITION_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARTITION_EXECUTOR = os.environ.get("PARTITION_EXECUTOR", "thread")
 
-    contents = await file.read()
-    filename = file.filename.lower()
+_partition_pool = None
+_partition_pool_lock = threading.Lock()
 
+def get_partition_pool():
+    global _partition_pool
+    with _partition_pool_lock:
+        if _partition_pool is None:
+            if PARTITION_EXECUTOR == "process":
+                _partition_pool = ProcessPoolExecutor(PARTITION_WORKERS, mp_context=mp_context())
+            else:
+                _partition_pool = ThreadPoolExecutor(PARTITION_WORKERS)
+        return _partition_pool
+
+def reset_partition_pool(broken):
+    # A pool process died; the next upload starts a new pool
+    global _partition_pool
+    with _partition_pool_lock:
+        if _partition_pool is broken:
+            _partition_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def score_partition(department, part):
+    # Predictions, roadmap and class comparison for one department's rows.
+    # Metrics are captured here since pool threads/processes do not see the
+    # caller's capture
+    with capture() as observations:
+        version, model = model_store.predictor(len(part))
+        if model is None:
+            raise JobError("Model not loaded.", status_code=500)
+        input_features = part.drop(columns=["Student_ID", "First_Name", "Last_Name"])
+        with stage("individuals", "predict", rows=len(part)):
+            part['Predicted_Score'] = prediction_cache.predict(
+                model, version, input_features,
+                lambda frame: timed_predict("individuals", model, frame))
+        with stage("individuals", "roadmap", rows=len(part)):
+            part['Improvement_Roadmap'] = ROADMAP_RULES.evaluate(part)
+
+        # Comparison to the department's class average
+        class_avg = part['Final_Score'].mean()
+        part['Compared_to_Class_Avg'] = compare_to_average(part['Final_Score'], class_avg)
+
+        summary = compute_aggregates(part, None)
+        summary.pop("version")
+        summary = {"department": department, "modules": department_modules[department],
+                   "students": summary.pop("rows"), **summary}
+    return part, summary, observations
+
+def score_partitions(partitions: list, report) -> list:
+    # [(department, frame)] -> [(frame, summary)] in the same order
+    workers = min(PARTITION_WORKERS, len(partitions))
+    results = [None] * len(partitions)
+    scored = 0
+    if workers <= 1:
+        for i, (dept, part) in enumerate(partitions):
+            results[i] = score_partition(dept, part)
+            scored += len(part)
+            report(stage="scoring", rows_processed=scored)
+    else:
+        executor = get_partition_pool()
+        try:
+            futures = {executor.submit(score_partition, dept, part): i
+                       for i, (dept, part) in enumerate(partitions)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                scored += len(partitions[i][1])
+                report(stage="scoring", rows_processed=scored)
+        except BrokenProcessPool:
+            reset_partition_pool(executor)
+            raise JobError("A scoring process died; please retry the upload.", status_code=503)
+    merged = []
+    for part, summary, observations in results:
+        replay(observations)
+        merged.append((part, summary))
+    return merged
+
+def process_insights(report, path, kind):
+    # Runs in a job worker; metrics are captured and replayed by finish_insights
+    with capture() as observations:
+        result, df = build_insights(report, path, kind)
+    return result, df, observations
+
+def build_insights(report, path, kind):
+    # Parse, then score each department as its own partition
     try:
-        if filename.endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(contents))
-        elif filename.endswith((".xlsx", ".xls")):
-            df = pd.read_excel(io.BytesIO(contents))
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format.")
+        if not model_store.ready():
+            raise JobError("Model not loaded.", status_code=500)
 
-        # Required columns
-        required_cols = [
-            "Student_ID", "First_Name", "Last_Name", "Department",
-            "Age", "Gender", "Study_Hours_per_Week", "Stress_Level (1-10)",
-            "Sleep_Hours_per_Night", "Participation_Score", "Projects_Score",
-            "Attendance (%)", "Midterm_Score", "Final_Score", "Quizzes_Avg", "Assignments_Avg",
-            "Grade", "Internet_Access_at_Home", "Extracurricular_Activities", 
-            "Parent_Education_Level", "Family_Income_Level"
-        ]
-
-        if not all(col in df.columns for col in required_cols):
-            raise HTTPException(status_code=400, detail="Missing required columns.")
+        chunks = []
+        rows = 0
+        for chunk in timed_iter("individuals", "parse", iter_chunks(path, kind, usecols=required_cols)):
+            chunks.append(chunk)
+            rows += len(chunk)
+            report(stage="parsing", rows_processed=rows)
+        with stage("individuals", "concat"):
+            df = concat_chunks(chunks)
+        del chunks
+        if df.empty:
+            raise JobError("Uploaded file has no rows.")
 
-        dept = df.iloc[0]['Department']
-        modules = department_modules.get(dept)
-        if not modules:
-            raise HTTPException(status_code=400, detail=f"Unknown department '{dept}'.")
+        with stage("individuals", "partition", rows=len(df)):
+            groups = df.groupby(df["Department"].astype(str), sort=False).indices
+            unknown = [dept for dept in groups if dept not in department_modules]
+            if unknown:
+                raise JobError("Unknown department " + ", ".join(f"'{dept}'" for dept in unknown) + ".")
+            partitions = [(dept, df.iloc[positions]) for dept, positions in groups.items()]
+        del df
+        scored = score_partitions(partitions, report)
+        del partitions
 
-        # Predictions
-        input_features = df.drop(columns=["Student_ID", "First_Name", "Last_Name"])
-        predictions = model.predict(input_features)
-        df['Predicted_Score'] = predictions
+        # Back in upload order
+        with stage("individuals", "concat"):
+            df = pd.concat([part for part, _ in scored]).sort_index().reset_index(drop=True)
+        departments = [summary for _, summary in scored]
 
-        # Comparison to class average
-        class_avg = df['Final_Score'].mean()
-        df['Compared_to_Class_Avg'] = df['Final_Score'].apply(
-            lambda x: "Above Average" if x > class_avg else ("Below Average" if x < class_avg else "Average")
-        )
+        with stage("individuals", "serialize", rows=len(df)):
+            insights = df[["Student_ID", "First_Name", "Last_Name", "Department", "Predicted_Score",
+                           "Compared_to_Class_Avg", "Improvement_Roadmap"]].to_dict(orient="records")
+        # "department"/"modules" keep their single-department meaning for
+        # existing clients; every department is described in "departments"
+        single = departments[0] if len(departments) == 1 else None
+        result = {
+            "department": single["department"] if single else None,
+            "modules": single["modules"] if single else [],
+            "departments": departments,
+            "insights": insights,
+        }
 
-        # Roadmap
-        def roadmap(row):
-            tips = []
-            if row['Attendance (%)'] < 75:
-                tips.append("Improve class attendance.")
-            if row['Study_Hours_per_Week'] < 10:
-                tips.append("Increase study hours.")
-            if row['Predicted_Score'] < 50:
-                tips.append("Seek academic support.")
-            if not tips:
-                tips.append("Maintain current effort and stay consistent.")
-            return tips
+        # Save uploaded data for later retrieval
+        report(stage="publishing", rows_processed=rows)
+        if in_job_worker() and not dataset.shared_dir:
+            # Only the API process can publish it; hand the frame back
+            return result, df
+        with stage("individuals", "publish", rows=len(df)):
+            if in_job_worker():
+                dataset.publish_shared(df)
+            else:
+                dataset.publish(df)
+        return result, None
 
-        df['Improvement_Roadmap'] = df.apply(roadmap, axis=1)
+    except JobError:
+        raise
+    except Exception as e:
+        raise JobError(f"Error processing file: {str(e)}", status_code=500)
+    finally:
+        remove_quietly(path)
 
-        uploaded_data = df  # Save uploaded data for later retrieval
+def finish_insights(job, value):
+    result, df, observations = value
+    replay(observations)
+    if df is not None:
+        with stage("individuals", "publish", rows=len(df)):
+            dataset.publish(df)
+    return result
 
-        insights = df[["Student_ID", "First_Name", "Last_Name", "Predicted_Score",
-                       "Compared_to_Class_Avg", "Improvement_Roadmap"]].to_dict(orient="records")
+@app.post("/student/insights")
+async def student_insights(
+    file: UploadFile = File(...),
+    async_job: bool = Query(False, description="Return 202 with a job id instead of waiting"),
+):
+    if not model_store.ready():
+        raise HTTPException(status_code=500, detail="Model not loaded.")
+
+    # Spool to disk and parse in chunks so raw bytes and the frame never coexist in memory
+    path = await spool_upload(file, suffix=os.path.splitext((file.filename or "").lower())[1])
 
-        return {"department": dept, "modules": modules, "insights": insights}
+    try:
+        # The format comes from the content, not the file name
+        kind = sniff_kind(path, file.filename)
+        if kind is None:
+            raise HTTPException(status_code=400, detail="Unsupported file format.")
 
+        # Validate the header before reading any rows
+        with stage("individuals", "validate"):
+            columns = read_columns(path, kind)
+        if not all(col in columns for col in required_cols):
+            raise HTTPException(status_code=400, detail="Missing required columns.")
+    except HTTPException:
+        remove_quietly(path)
+        raise
     except Exception as e:
+        remove_quietly(path)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
-@app.get("/student-insights/{student_id}")
-def get_student_insights(student_id: str):
-    global uploaded_data
+    # Scoring runs in the job pool; the spooled file is removed once the job
+    # ends, also when its worker process dies
+    job = jobs.submit("student-insights", process_insights, path, kind, on_done=finish_insights,
+                      cleanup=lambda: remove_quietly(path))
+    if async_job:
+        return JSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+        })
 
-    if uploaded_data.empty:
-        raise HTTPException(status_code=404, detail="No data uploaded yet.")
+    await jobs.wait(job)
+    if job.status == FAILED:
+        raise HTTPException(status_code=job.error_status or 500, detail=job.error)
+    return jobs.result(job)
 
-    if student_id not in uploaded_data["Student_ID"].astype(str).values:
-        raise HTTPException(status_code=404, detail="Student not found.")
+@app.get("/model/info")
+def model_info():
+    return {**model_store.info(), "prediction_cache": prediction_cache.stats()}
 
-    student_row = uploaded_data[uploaded_data["Student_ID"].astype(str) == student_id].iloc[0]
-
-    skill_columns = [
-        "Midterm_Score", "Final_Score", "Assignments_Avg",
-        "Quizzes_Avg", "Participation_Score", "Projects_Score"
-    ]
+def build_insight_payload(snapshot, student_id: str, pos: int) -> dict:
+    skill_columns = SKILL_COLUMNS
+    student_row = snapshot.frame.iloc[[pos]][skill_columns].iloc[0]
 
+    # Compared against the student's own department
+    department = str(snapshot.frame["Department"].iloc[pos])
+    aggregates = snapshot.derived["departments"].get(department, snapshot.derived["aggregates"])
     student_scores = {col: float(student_row[col]) for col in skill_columns}
-    class_averages = uploaded_data[skill_columns].mean().round(2).to_dict()
-
-    threshold = uploaded_data["Final_Score"].quantile(0.9)
-    top_students = uploaded_data[uploaded_data["Final_Score"] >= threshold]
-    top_averages = top_students[skill_columns].mean().round(2).to_dict()
+    class_averages = aggregates["class_averages"]
+    top_averages = aggregates["top_performer_averages"]
 
     improvement_areas = {}
     for col in skill_columns:
@@ -141,9 +314,29 @@ def get_student_insights(student_id: str):
 
     return {
         "student_id": student_id,
+        "department": department,
         "student_scores": student_scores,
         "class_averages": class_averages,
         "top_performer_averages": top_averages,
         "improvement_percentages": improvement_areas
     }
 
+@app.get("/student-insights/{student_id}")
+def get_student_insights(student_id: str):
+    snapshot = dataset.current()
+    if snapshot is None or snapshot.frame.empty:
+        raise HTTPException(status_code=404, detail="No data uploaded yet.")
+
+    insight_cache = snapshot.cache.setdefault("insights", {})
+    payload = insight_cache.get(student_id)
+    cache_lookup("student_insights", payload is not None)
+    if payload is not None:
+        return payload
+
+    pos = snapshot.derived["student_index"].get(student_id)
+    if pos is None:
+        raise HTTPException(status_code=404, detail="Student not found.")
+
+    payload = build_insight_payload(snapshot, student_id, pos)
+    insight_cache[student_id] = payload
+    return payload
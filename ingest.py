@@ -0,0 +1,307 @@
+import hashlib
+import importlib.util
+import os
+import tempfile
+from typing import Iterable, Iterator, List, Optional
+
+import pandas as pd
+from fastapi import UploadFile
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; parsed workbooks are not cached without it
+    pa = None
+
+CSV = "csv"
+EXCEL = "excel"  # .xlsx (zip container)
+XLS = "xls"      # legacy .xls (OLE2 container)
+
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+SNIFF_BYTES = 4096
+
+# python-calamine (Rust) parses xlsx several times faster than openpyxl, but
+# only whole sheets: the parsed sheet and its frame are held in memory at
+# once. It is used for .xls (read whole either way) and for xlsx files up to
+# CALAMINE_MAX_BYTES; larger xlsx files are streamed through openpyxl, which
+# is slower but keeps peak memory to one chunk
+CALAMINE = importlib.util.find_spec("python_calamine") is not None
+CALAMINE_MAX_BYTES = int(os.environ.get("CALAMINE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Parsed workbooks cached as Parquet by content hash, so re-uploading the
+# same file skips parsing; INGEST_CACHE_DIR="" disables the cache
+INGEST_CACHE_DIR = os.environ.get("INGEST_CACHE_DIR", "ingest_cache")
+INGEST_CACHE_ENTRIES = int(os.environ.get("INGEST_CACHE_ENTRIES", "64"))
+
+SPOOL_CHUNK_BYTES = 1 << 20
+CHUNK_ROWS = 50_000
+
+# Low-cardinality text columns stored as categoricals. Score columns stay
+# float64: float32 would change the values the API returns
+CATEGORY_COLUMNS = ["Gender", "Department", "Grade"]
+
+
+def file_kind(filename: str):
+    filename = (filename or "").lower()
+    if filename.endswith(".csv"):
+        return CSV
+    if filename.endswith(".xlsx"):
+        return EXCEL
+    if filename.endswith(".xls"):
+        return XLS
+    return None
+
+
+def sniff_kind(path: str, filename: str = None):
+    # Picks the format from the file's leading bytes; the filename only
+    # breaks ties for text files, which are read as CSV
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if head.startswith(XLSX_MAGIC):
+        return EXCEL
+    if head.startswith(XLS_MAGIC):
+        return XLS
+    if not head or b"\x00" in head:
+        return None
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Only a multi-byte character cut off by the sniff window is allowed;
+        # other encodings are accepted when the name says CSV
+        if e.start < len(head) - 3 and file_kind(filename) != CSV:
+            return None
+    return CSV
+
+
+# Content hashes computed while spooling, keyed by temp file path
+_digests = {}
+
+
+async def spool_upload(file: UploadFile, suffix: str = "") -> str:
+    # Copy the upload to disk in fixed-size pieces instead of one big read(),
+    # hashing it on the way for the converted cache
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await file.read(SPOOL_CHUNK_BYTES)
+                if not block:
+                    break
+                digest.update(block)
+                out.write(block)
+    except Exception:
+        remove_quietly(path)
+        raise
+    _digests[path] = digest.hexdigest()
+    return path
+
+
+def remove_quietly(path: str):
+    _digests.pop(path, None)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def file_digest(path: str) -> str:
+    digest = _digests.get(path)
+    if digest is None:
+        # Not spooled by this process (e.g. a job worker forked earlier)
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(SPOOL_CHUNK_BYTES), b""):
+                hasher.update(block)
+        digest = _digests[path] = hasher.hexdigest()
+    return digest
+
+
+def cache_path(path: str, kind: str) -> Optional[str]:
+    # Only spreadsheets are cached; CSV parsing is already cheap
+    if kind not in (EXCEL, XLS) or not INGEST_CACHE_DIR or pa is None:
+        return None
+    return os.path.join(INGEST_CACHE_DIR, f"{file_digest(path)}.parquet")
+
+
+def _read_whole(path: str, kind: str) -> bool:
+    # Whether a spreadsheet is parsed in one go by pd.read_excel rather than
+    # streamed row by row
+    if kind == XLS:
+        return True
+    return CALAMINE and os.path.getsize(path) <= CALAMINE_MAX_BYTES
+
+
+def read_columns(path: str, kind: str) -> List[str]:
+    # Header only; no data rows are parsed
+    cached = cache_path(path, kind)
+    if cached and os.path.exists(cached):
+        columns = pq.read_schema(cached).names
+    elif kind == CSV:
+        columns = pd.read_csv(path, nrows=0).columns
+    elif _read_whole(path, kind):
+        columns = pd.read_excel(path, nrows=0, engine="calamine" if CALAMINE else None).columns
+    else:
+        columns = next(_iter_xlsx_rows(path), [])
+    return [str(col).strip() for col in columns]
+
+
+def _iter_xlsx_rows(path: str):
+    # Streams rows through openpyxl's read-only mode; the first row yielded
+    # is the header, with trailing empty cells trimmed
+    import openpyxl
+
+    # Opened through a file object: openpyxl only checks the extension for
+    # paths, and spooled uploads may be named anything
+    source = open(path, "rb")
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        width = None
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            if not any(value is not None for value in row):
+                continue
+            if width is None:
+                width = len(row)
+                while width and row[width - 1] is None:
+                    width -= 1
+            yield row[:width]
+    finally:
+        workbook.close()
+        source.close()
+
+
+def _iter_raw_chunks(path: str, kind: str, chunksize: int, usecols=None) -> Iterator[pd.DataFrame]:
+    # ``usecols`` is a set of (stripped) column names to parse, or None for all
+    wanted = None if usecols is None else (lambda name: str(name).strip() in usecols)
+    if kind == CSV:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=wanted)
+    elif _read_whole(path, kind):
+        # No streaming reader here; parse the first sheet once and slice
+        df = pd.read_excel(path, sheet_name=0, usecols=wanted, engine="calamine" if CALAMINE else None)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        rows = _iter_xlsx_rows(path)
+        header = next(rows, None)
+        if header is None:
+            return
+        keep = None
+        if usecols is not None:
+            keep = [i for i, name in enumerate(header) if str(name).strip() in usecols]
+            header = [header[i] for i in keep]
+        buffer = []
+        for row in rows:
+            buffer.append(row if keep is None else [row[i] if i < len(row) else None for i in keep])
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+
+
+def _iter_cached(cached: str, chunksize: int, usecols=None) -> Iterator[pd.DataFrame]:
+    parquet = pq.ParquetFile(cached)
+    columns = None
+    if usecols is not None:
+        columns = [name for name in parquet.schema_arrow.names if name in usecols]
+    for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def _write_through(chunks: Iterable[pd.DataFrame], cached: str) -> Iterator[pd.DataFrame]:
+    # Yields the chunks unchanged while writing them to a Parquet file; the
+    # file only appears under its final name once every chunk was written
+    tmp_path = f"{cached}.{os.getpid()}.tmp"
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is not False:
+                try:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+                except (pa.ArrowException, ValueError, TypeError) as e:
+                    # Mixed-type columns etc.: serve this upload uncached
+                    print("❌ Not caching parsed workbook:", e)
+                    if writer:
+                        writer.close()
+                    writer = False
+                    remove_quietly(tmp_path)
+            yield chunk
+        if writer:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, cached)
+            _evict_cache()
+    finally:
+        if writer:
+            writer.close()
+        remove_quietly(tmp_path)
+
+
+def _evict_cache():
+    # Keep the most recently used entries
+    try:
+        entries = [os.path.join(INGEST_CACHE_DIR, name) for name in os.listdir(INGEST_CACHE_DIR)
+                   if name.endswith(".parquet")]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for stale in entries[INGEST_CACHE_ENTRIES:]:
+            remove_quietly(stale)
+    except OSError:
+        pass
+
+
+def downcast(df: pd.DataFrame) -> pd.DataFrame:
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _strip_columns(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        chunk.columns = [str(col).strip() for col in chunk.columns]
+        yield chunk.reset_index(drop=True)
+
+
+def iter_chunks(path: str, kind: str, chunksize: int = CHUNK_ROWS,
+                usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    # ``usecols`` limits parsing to the named columns (others are skipped)
+    usecols = set(usecols) if usecols is not None else None
+    cached = cache_path(path, kind)
+    select = False
+    if cached and os.path.exists(cached):
+        os.utime(cached)  # mark as recently used
+        chunks = _iter_cached(cached, chunksize, usecols)
+    elif cached:
+        # Cache the whole sheet so later uploads can select any columns
+        os.makedirs(INGEST_CACHE_DIR, exist_ok=True)
+        chunks = _write_through(_strip_columns(_iter_raw_chunks(path, kind, chunksize)), cached)
+        select = usecols is not None
+    else:
+        chunks = _strip_columns(_iter_raw_chunks(path, kind, chunksize, usecols))
+
+    for chunk in chunks:
+        if select:
+            chunk = chunk[[col for col in chunk.columns if col in usecols]]
+        yield downcast(chunk)
+
+
+def read_frame(path: str, kind: str, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+    return concat_chunks(list(iter_chunks(path, kind, usecols=usecols)))
+
+
+def concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    if not chunks:
+        return pd.DataFrame()
+    # Give every chunk the same categories so concat keeps the category dtype
+    for col in CATEGORY_COLUMNS:
+        if col in chunks[0].columns:
+            categories = pd.api.types.union_categoricals(
+                [chunk[col] for chunk in chunks], ignore_order=True
+            ).categories
+            for chunk in chunks:
+                chunk[col] = chunk[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,427 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+# Job status files, so any worker process can answer /jobs/{id}
+JOBS_DIR = os.environ.get("JOBS_DIR", "jobs")
+MAX_JOBS = 200
+# Job files older than this are removed, as are all but the newest MAX_JOBS
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", str(24 * 3600)))
+SWEEP_INTERVAL = 60.0
+
+# Pool processes are started from a clean server process rather than forked
+# from the (multithreaded) API process, which can deadlock
+JOB_START_METHOD = os.environ.get("JOB_START_METHOD", "forkserver")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Set in each pool process by _init_worker
+_progress_queue = None
+
+
+class JobError(Exception):
+    """A task failure caused by the submitted data rather than the server."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+    def __reduce__(self):
+        # Keeps status_code when the error crosses the process boundary
+        return (JobError, (str(self), self.status_code))
+
+
+def mp_context():
+    # Start method for every process pool here: JOB_START_METHOD, or spawn
+    # where that is unavailable
+    method = JOB_START_METHOD if JOB_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def in_job_worker() -> bool:
+    # True inside a job pool process, where publishing to in-memory state
+    # would not reach the API process
+    return _progress_queue is not None
+
+
+def _run_in_worker(fn: Callable, job_id: str, args: tuple):
+    def report(**progress):
+        _progress_queue.put((job_id, progress))
+    report(status=RUNNING)
+    return fn(report, *args)
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.progress = {}
+        # Kept in memory only while it has no result file (see JobManager)
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self, include_result: bool = False) -> dict:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "error_status": self.error_status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result and self.finished:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """Runs long upload-processing tasks off the event loop.
+
+    Tasks are module-level functions ``fn(report, *args)`` executed in a
+    process pool (``JOB_EXECUTOR=thread`` uses threads instead); ``report``
+    sends progress updates back to the job. ``on_done(job, value)`` runs in
+    the API process and turns the task's return value into the stored result,
+    and ``cleanup()`` runs there once the job has finished either way, even
+    if its worker process died.
+
+    With ``jobs_dir`` each job has a small status file, rewritten on every
+    update, and its result is written once to a separate result file and
+    not kept in memory; ``result(job)`` reads it back. Both files are swept
+    after ``JOB_TTL_SECONDS`` or when more than ``MAX_JOBS`` exist.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, executor: str = "process", jobs_dir: str = JOBS_DIR):
+        self.max_workers = max_workers
+        self.executor_kind = executor
+        self.jobs_dir = jobs_dir or None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress = None
+        self._last_sweep = 0.0
+        if self.jobs_dir:
+            os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def _ensure_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                return
+            if self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(self.max_workers)
+                return
+            ctx = mp_context()
+            self._progress = ctx.Queue()
+            self._executor = ProcessPoolExecutor(
+                self.max_workers, mp_context=ctx,
+                initializer=_init_worker, initargs=(self._progress,),
+            )
+            threading.Thread(target=self._drain_progress, args=(self._progress,), daemon=True).start()
+
+    def _reset_executor(self, broken):
+        # A worker died (e.g. killed for memory) and the pool refuses new
+        # work; the next submit starts a fresh one
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+            progress, self._progress = self._progress, None
+        print("❌ Job pool is broken, starting a new one.")
+        broken.shutdown(wait=False, cancel_futures=True)
+        if progress is not None:
+            progress.put(None)  # stops its drain thread
+
+    def _drain_progress(self, progress_queue):
+        while True:
+            try:
+                item = progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            job_id, progress = item
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._update(job, progress)
+
+    def _update(self, job: Job, progress: dict):
+        status = progress.pop("status", None)
+        if status == RUNNING and job.status == QUEUED:
+            job.status = RUNNING
+            job.started_at = time.time()
+        job.progress = {**job.progress, **progress}
+        self._persist(job)
+
+    def _fail(self, job: Job, error: Exception):
+        if isinstance(error, BrokenProcessPool):
+            job.error = "The job's worker process died (e.g. out of memory)."
+            job.error_status = 503
+        else:
+            job.error = str(error)
+            job.error_status = getattr(error, "status_code", 500)
+        job.status = FAILED
+
+    def _start(self, job: Job, fn: Callable, args: tuple):
+        # Returns (executor, future)
+        self._ensure_executor()
+        executor = self._executor
+        try:
+            if self.executor_kind == "thread":
+                def report(**progress):
+                    self._update(job, progress)
+                report(status=RUNNING)
+                return executor, executor.submit(fn, report, *args)
+            return executor, executor.submit(_run_in_worker, fn, job.id, args)
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise
+
+    def _finish(self, job: Job, cleanup: Optional[Callable]):
+        job.finished_at = time.time()
+        self._persist(job)
+        if cleanup:
+            cleanup()
+
+    def submit(self, kind: str, fn: Callable, *args, on_done: Callable = None,
+               cleanup: Callable = None) -> Job:
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._sweep()
+        self._persist(job)
+
+        try:
+            try:
+                executor, future = self._start(job, fn, args)
+            except BrokenProcessPool:
+                # Broken by an earlier job; retried once on a fresh pool
+                executor, future = self._start(job, fn, args)
+        except Exception as e:
+            self._fail(job, e)
+            self._finish(job, cleanup)
+            return job
+
+        def finish(done):
+            try:
+                value = done.result()
+                result = on_done(job, value) if on_done else value
+                if not self._persist_result(job, result):
+                    job.result = result
+                job.status = DONE
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._reset_executor(executor)
+                self._fail(job, e)
+            finally:
+                self._finish(job, cleanup)
+
+        job.future = future
+        future.add_done_callback(finish)
+        return job
+
+    def _evict(self):
+        # Drop the oldest finished jobs from memory
+        finished = [j for j in self._jobs.values() if j.finished]
+        for job in sorted(finished, key=lambda j: j.created_at)[:max(0, len(self._jobs) - MAX_JOBS)]:
+            self._jobs.pop(job.id, None)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _result_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.result.json")
+
+    def _write(self, path: str, data) -> bool:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, default=str)
+            os.replace(tmp_path, path)
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            print(f"❌ Could not persist {os.path.basename(path)}:", e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def _persist(self, job: Job):
+        # Status only; results are written once by _persist_result
+        if self.jobs_dir:
+            self._write(self._path(job.id), job.to_dict())
+
+    def _persist_result(self, job: Job, result) -> bool:
+        return bool(self.jobs_dir) and self._write(self._result_path(job.id), result)
+
+    def _read_result(self, job_id: str):
+        with open(self._result_path(job_id)) as f:
+            return json.load(f)
+
+    def _sweep(self):
+        # Removes expired job files and keeps at most MAX_JOBS; runs from
+        # submit at most once per SWEEP_INTERVAL
+        now = time.time()
+        if not self.jobs_dir or now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        try:
+            names = [name for name in os.listdir(self.jobs_dir)
+                     if name.endswith(".json") and not name.endswith(".result.json")]
+        except OSError:
+            return
+        statuses = []
+        for name in names:
+            try:
+                statuses.append((os.path.getmtime(os.path.join(self.jobs_dir, name)), name[:-len(".json")]))
+            except OSError:
+                pass
+        statuses.sort(reverse=True)
+        for rank, (mtime, job_id) in enumerate(statuses):
+            if rank < MAX_JOBS and now - mtime < JOB_TTL_SECONDS:
+                continue
+            job = self._jobs.get(job_id)
+            if job is not None and not job.finished:
+                continue
+            for path in (self._path(job_id), self._result_path(job_id)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def result(self, job: Job):
+        # A finished job's result, from memory or its result file
+        if job.result is not None or not self.jobs_dir or job.status != DONE:
+            return job.result
+        try:
+            return self._read_result(job.id)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            data = job.to_dict()
+        elif self.jobs_dir and all(c in "0123456789abcdef" for c in job_id):
+            # Submitted by another worker process
+            try:
+                with open(self._path(job_id)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return None
+        else:
+            return None
+        if include_result and data["status"] in (DONE, FAILED):
+            if job is not None and job.result is not None:
+                data["result"] = job.result
+            elif self.jobs_dir and data["status"] == DONE:
+                try:
+                    data["result"] = self._read_result(job_id)
+                except (OSError, ValueError):
+                    data["result"] = None
+            else:
+                data["result"] = None
+        return data
+
+    async def wait(self, job: Job) -> Job:
+        # Awaits the job without blocking the event loop; failures are
+        # reported through job.status/job.error
+        if job.future is not None:
+            try:
+                await asyncio.wrap_future(job.future)
+            except Exception:
+                pass
+        while not job.finished:
+            await asyncio.sleep(0.01)
+        return job
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    # One job manager per process, shared by every service module
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            workers = os.environ.get("JOB_WORKERS")
+            _manager = JobManager(
+                max_workers=int(workers) if workers else None,
+                executor=os.environ.get("JOB_EXECUTOR", "process"),
+            )
+        return _manager
+
+
+router = APIRouter()
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = get_job_manager().get(job_id, include_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=job.get("error_status") or 500, detail=job["error"])
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}.")
+    return job["result"]
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    # Server-sent events with the job status until it finishes
+    manager = get_job_manager()
+    if manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def events():
+        last = None
+        while True:
+            job = manager.get(job_id)
+            if job is None:
+                return
+            if job != last:
+                yield f"data: {json.dumps(job, default=str)}\n\n"
+                last = job
+            if job["status"] in (DONE, FAILED):
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -0,0 +1,370 @@
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+try:
+    import pyinstrument
+except ImportError:  # optional; X-Profile: pyinstrument falls back to cProfile
+    pyinstrument = None
+
+# Per-request profiling via the X-Profile header is only honoured when
+# PROFILING=1, since profiles expose code paths and slow the request down
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILE_HEADER = b"x-profile"
+PROFILE_ON = {"1", "true", "yes", "on"}
+PROFILE_LINES = 60
+# From 3.12 cProfile hooks sys.monitoring, which covers every thread and
+# allows only one active profiler per process; before that it only sees
+# the thread that enabled it
+PROFILER_ALL_THREADS = sys.version_info >= (3, 12)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456)
+ROW_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+        if _record("inc", self.name, labels, amount):
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, *labels, value: float):
+        if _record("observe", self.name, labels, value):
+            return
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, count, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = _label_text(self.labels + ("le",), labels + (f"{bound:g}",))
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _label_text(self.labels + ("le",), labels + ("+Inf",))
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, labels)} {count}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, labels)} {total:.6f}")
+        return lines
+
+
+REGISTRY = []
+
+HTTP_SECONDS = Histogram("capstone_http_request_seconds", "HTTP request latency.",
+                         ["service", "method", "route", "status"])
+HTTP_BYTES = Histogram("capstone_http_payload_bytes", "HTTP request and response body sizes.",
+                       ["service", "route", "direction"], buckets=SIZE_BUCKETS)
+STAGE_SECONDS = Histogram("capstone_stage_seconds", "Time spent in each processing stage.",
+                          ["service", "stage"])
+INFERENCE_SECONDS = Histogram("capstone_model_inference_seconds", "Latency of one model.predict call.",
+                              ["service"])
+INFERENCE_ROWS = Histogram("capstone_model_inference_rows", "Rows scored per model.predict call.",
+                           ["service"], buckets=ROW_BUCKETS)
+ROWS_PROCESSED = Counter("capstone_rows_processed_total", "Rows processed per stage.", ["service", "stage"])
+CACHE_REQUESTS = Counter("capstone_cache_requests_total", "Cache lookups by outcome.", ["cache", "result"])
+
+_METRICS = {metric.name: metric for metric in REGISTRY}
+
+# Set by capture(): observations are collected instead of recorded, so
+# work done in a job worker process can be replayed in the API process
+_captured = contextvars.ContextVar("captured_metrics", default=None)
+# Set by the middleware for the duration of a request
+_request = contextvars.ContextVar("request_metrics", default=None)
+# The request's profiler, when it asked for one; copied into threadpool
+# calls along with the rest of the context
+_profiler = contextvars.ContextVar("request_profiler", default=None)
+# Whether a thread profiler is already running on this thread
+_profiling = threading.local()
+
+
+def _record(kind: str, name: str, labels: tuple, value: float) -> bool:
+    captured = _captured.get()
+    if captured is None:
+        return False
+    captured.append((kind, name, labels, value))
+    return True
+
+
+@contextmanager
+def capture():
+    observations = []
+    token = _captured.set(observations)
+    try:
+        yield observations
+    finally:
+        _captured.reset(token)
+
+
+def replay(observations: Optional[list]):
+    for kind, name, labels, value in observations or ():
+        metric = _METRICS.get(name)
+        if kind == "inc" and isinstance(metric, Counter):
+            metric.inc(*labels, amount=value)
+        elif kind == "observe" and isinstance(metric, Histogram):
+            metric.observe(*labels, value=value)
+
+
+@contextmanager
+def stage(service: str, name: str, rows: Optional[int] = None):
+    # Times one processing stage; also feeds the per-request profile and the
+    # Server-Timing header when the request asked for them
+    request = _request.get()
+    profiler = None
+    if not PROFILER_ALL_THREADS and isinstance(_profiler.get(), cProfile.Profile) \
+            and threading.get_ident() != request["thread"] and not getattr(_profiling, "active", False):
+        # The request's profiler only sees the event-loop thread here; this
+        # thread's calls are merged into its report
+        profiler = cProfile.Profile()
+        profiler.enable()
+        _profiling.active = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            _profiling.active = False
+            request["profilers"].append(profiler)
+        STAGE_SECONDS.observe(service, name, value=elapsed)
+        if rows is not None:
+            ROWS_PROCESSED.inc(service, name, amount=rows)
+        if request is not None:
+            request["stages"].append((name, elapsed))
+
+
+def timed_iter(service: str, name: str, iterable):
+    # Times each step of a lazy iterator (e.g. chunked file parsing) as a stage
+    iterator = iter(iterable)
+    while True:
+        with stage(service, name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def timed_predict(service: str, model, frame):
+    # model.predict with inference latency and batch size recorded
+    start = time.perf_counter()
+    predictions = model.predict(frame)
+    INFERENCE_SECONDS.observe(service, value=time.perf_counter() - start)
+    INFERENCE_ROWS.observe(service, value=len(frame))
+    return predictions
+
+
+def cache_lookup(cache: str, hit: bool, count: int = 1):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss", amount=count)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+class MetricsMiddleware:
+    """Records latency and body sizes per route and serves request profiles.
+
+    With ``PROFILING=1``, a request carrying ``X-Profile: 1`` (``true``,
+    ``yes``, ``on``; or ``X-Profile: pyinstrument``) gets the profile as its
+    response body instead of the normal response. Only one request is
+    profiled at a time. Every response carries a
+    ``Server-Timing`` header with the stages timed during the request.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = None
+        if PROFILING:
+            mode = _profile_mode(dict(scope["headers"]).get(PROFILE_HEADER, b""))
+        request = {"stages": [], "thread": threading.get_ident(),
+                   "profilers": [] if mode else None}
+        token = _request.set(request)
+        state = {"status": 500, "sent": 0, "received": 0}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["received"] += len(message.get("body", b""))
+            return message
+
+        buffered = []
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if request["stages"]:
+                    totals = {}
+                    for name, elapsed in request["stages"]:
+                        totals[name] = totals.get(name, 0.0) + elapsed
+                    timing = ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in totals.items())
+                    message = {**message, "headers": list(message.get("headers", []))
+                               + [(b"server-timing", timing.encode())]}
+            elif message["type"] == "http.response.body":
+                state["sent"] += len(message.get("body", b""))
+            if mode:
+                buffered.append(message)
+            else:
+                await send(message)
+
+        start = time.perf_counter()
+        profiler, busy = _start_profile(mode)
+        profiler_token = _profiler.set(profiler)
+        try:
+            await self.app(scope, counting_receive, timed_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            report = None
+            if profiler is not None:
+                report = _stop_profile(profiler, request["profilers"])
+            elif mode:
+                report = f"Not profiled: {busy}\n"
+            _profiler.reset(profiler_token)
+            _request.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(self.service, scope["method"], route, str(state["status"]), value=elapsed)
+            HTTP_BYTES.observe(self.service, route, "in", value=state["received"])
+            HTTP_BYTES.observe(self.service, route, "out", value=state["sent"])
+
+        if mode:
+            body = report.encode()
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(state["status"]).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+
+
+def _profile_mode(value: bytes):
+    # "pyinstrument", "cprofile" for a true-ish X-Profile value, else None
+    value = value.decode("latin-1").strip().lower()
+    if value == "pyinstrument":
+        return value
+    return "cprofile" if value in PROFILE_ON else None
+
+
+_profile_lock = threading.Lock()
+
+
+def _start_profile(mode):
+    # (profiler, reason it could not start)
+    if not mode:
+        return None, None
+    if not _profile_lock.acquire(blocking=False):
+        return None, "another request is being profiled."
+    try:
+        if mode == "pyinstrument" and pyinstrument is not None:
+            profiler = pyinstrument.Profiler(async_mode="enabled")
+            profiler.start()
+            return profiler, None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler, None
+    except (ValueError, RuntimeError) as e:
+        # e.g. another profiling tool is active in this process
+        _profile_lock.release()
+        return None, str(e)
+
+
+def _stop_profile(profiler, stage_profilers) -> str:
+    try:
+        return _profile_report(profiler, stage_profilers)
+    finally:
+        _profile_lock.release()
+
+
+def _profile_report(profiler, stage_profilers) -> str:
+    if pyinstrument is not None and isinstance(profiler, pyinstrument.Profiler):
+        profiler.stop()
+        return profiler.output_text(unicode=True)
+    profiler.disable()
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    for extra in stage_profilers:
+        stats.add(extra)
+    stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return out.getvalue()
+
+
+def instrument(app, service: str):
+    # Adds request metrics and the /metrics endpoint to a service app
+    app.add_middleware(MetricsMiddleware, service=service)
+    app.include_router(router)
@@ -0,0 +1,56 @@
+"""Import per-student JSON mark files into the SQLite student store.
+
+    python migrate_student_data.py                      # every file in student_data/
+    python migrate_student_data.py 202300316.json ...   # specific files
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from student_store import DATA_DIR, STUDENT_COLUMNS, JsonStudentStore, SQLiteStudentStore
+
+
+def load_json_file(path: str) -> pd.DataFrame:
+    with open(path, "r") as f:
+        df = pd.DataFrame(json.load(f))
+    if df.empty:
+        return df
+    if "Student Number" not in df.columns:
+        df["Student Number"] = os.path.splitext(os.path.basename(path))[0]
+    return df[STUDENT_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="JSON files to import (default: all students in --src)")
+    parser.add_argument("--src", default=DATA_DIR, help="directory of <number>.json files")
+    parser.add_argument("--db", default=os.path.join(DATA_DIR, "marks.db"))
+    args = parser.parse_args()
+
+    target = SQLiteStudentStore(args.db)
+    start = time.perf_counter()
+    students = rows = 0
+
+    if args.files:
+        frames = [load_json_file(path) for path in args.files]
+    else:
+        # Goes through the JSON store so pending append logs are included
+        source = JsonStudentStore(args.src)
+        frames = [source.load(number) for number in source.student_numbers()]
+
+    for df in frames:
+        if df.empty:
+            continue
+        target.upsert(df[STUDENT_COLUMNS])
+        students += df["Student Number"].nunique()
+        rows += len(df)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Imported {rows} rows for {students} students into {args.db} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
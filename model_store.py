@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import joblib
+
+from compiled_model import CompiledPipeline, compile_pipeline
+from registry import read_meta, resolve_model_path
+
+MODEL_PATH = "student_performance_pipeline.joblib"
+# Batches up to this size are scored by the compiled model when available;
+# past roughly a thousand rows sklearn's own tree walk is faster
+COMPILED_MAX_ROWS = int(os.environ.get("COMPILED_MAX_ROWS", "512"))
+
+
+def resident_mb():
+    # Current resident set size of this process (Linux), None elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class ModelSnapshot(NamedTuple):
+    # One loaded artifact. Published as a whole, so a version is never
+    # paired with another artifact's model
+    version: Optional[str]
+    model: object
+    compiled: object
+
+
+class ModelStore:
+    """Serves the trained model once per process and hot-reloads it on change.
+
+    Models registered by train.py come with the compiled model's node tables
+    as ``.npy`` files (see compiled_model.py). When the sidecar names those
+    tables (``compiled_tables``, written by the registry that produced the
+    artifact), they are memory-mapped, so every worker shares
+    one page-cache copy, and the sklearn pipeline is only unpickled the first
+    time a batch above ``COMPILED_MAX_ROWS`` needs it. Otherwise the pipeline
+    is loaded and compiled in this process.
+
+    ``mmap_mode`` is passed to ``joblib.load`` but does not share the forest
+    between worker processes: sklearn's ``Tree.__setstate__`` copies the node
+    arrays into private memory, so every worker that loads the pipeline holds
+    a full copy either way.
+
+    Replacing the file atomically (``os.replace``, as ``train.py`` does) is
+    picked up by every worker on its next ``current()`` after
+    ``check_interval`` seconds; in-flight requests keep the model object they
+    already hold. Callers that key anything by ``version`` take it from the
+    same ``current()`` snapshot as the model.
+    """
+
+    def __init__(self, path: str = MODEL_PATH, mmap_mode: Optional[str] = None, check_interval: float = 5.0,
+                 compile: bool = True):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.check_interval = check_interval
+        self.compile = compile
+        self.snapshot = ModelSnapshot(None, None, None)
+        self.compile_error = None
+        self.compiled_source = None  # "mapped" (.npy tables) or "built" (in this process)
+        self.registry_version = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.rss_mb = None
+        self.rss_delta_mb = None
+        self.last_error = None
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _prebuilt_tables(self, meta, signature):
+        # The compiled tables registered with this artifact, if they exist
+        # and were built from a file of the same size (promote() writes the
+        # sidecar just before the artifact)
+        path = meta.get("compiled_tables")
+        registry_version = meta.get("registry_version")
+        if not self.compile or not path or not registry_version or signature is None:
+            return None
+        tables = CompiledPipeline.read_meta(path)
+        if tables.get("registry_version") != registry_version or tables.get("artifact_size") != signature[1]:
+            print(f"❌ Compiled tables at {path} do not match {self.path}.")
+            return None
+        return path
+
+    def _load_pipeline(self):
+        start = time.perf_counter()
+        model = joblib.load(self.path, mmap_mode=self.mmap_mode)
+        print(f"✅ Model pipeline loaded from {self.path} in {time.perf_counter() - start:.4f}s.")
+        return model
+
+    def load(self) -> ModelSnapshot:
+        with self._lock:
+            return self._load()
+
+    def _load(self) -> ModelSnapshot:
+        # Called with the lock held
+        signature = self._stat_signature()
+        meta = read_meta(self.path)
+        registry_version = meta.get("registry_version")
+        rss_before = resident_mb()
+        start = time.perf_counter()
+        model = compiled = None
+        tables = self._prebuilt_tables(meta, signature)
+        if tables:
+            try:
+                compiled = CompiledPipeline.load(tables, mmap_mode="r")
+            except Exception as e:
+                print(f"❌ Error mapping compiled model from {tables}, loading the pipeline instead:", e)
+        if compiled is None:
+            try:
+                model = self._load_pipeline()
+            except Exception as e:
+                # Keep serving the previous model if a reload fails
+                self.last_error = str(e)
+                self._signature = signature
+                print(f"❌ Error loading model from {self.path}:", e)
+                return self.snapshot
+            if self.compile:
+                print(f"No prebuilt compiled tables for {self.path}; compiling the model in this process.")
+                try:
+                    compiled = compile_pipeline(model)
+                    self.compile_error = None
+                except Exception as e:
+                    # Unsupported pipeline shape; everything keeps using sklearn
+                    self.compile_error = str(e)
+                    print("❌ Could not compile model, serving the sklearn pipeline only:", e)
+            self.compiled_source = "built" if compiled is not None else None
+        else:
+            self.compile_error = None
+            self.compiled_source = "mapped"
+
+        self.load_seconds = round(time.perf_counter() - start, 4)
+        self.rss_mb = resident_mb()
+        if rss_before is not None and self.rss_mb is not None:
+            self.rss_delta_mb = round(self.rss_mb - rss_before, 1)
+        self._signature = signature
+        version = "{:x}-{:x}".format(signature[2], signature[1]) if signature else None
+        self.registry_version = registry_version
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.last_error = None
+        # Single reference swap; readers never see a partial model or a
+        # version belonging to a different one
+        self.snapshot = ModelSnapshot(version, model, compiled)
+        print(f"✅ Model loaded from {tables or self.path} in {self.load_seconds}s (RSS {self.rss_mb} MB).")
+        return self.snapshot
+
+    def _with_pipeline(self) -> ModelSnapshot:
+        # Adds the sklearn pipeline to a snapshot served from mapped tables
+        with self._lock:
+            if self._stat_signature() != self._signature:
+                self._load()
+            snapshot = self.snapshot
+            if snapshot.model is not None or snapshot.compiled is None:
+                return snapshot
+            try:
+                model = self._load_pipeline()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Error loading model from {self.path}:", e)
+                return snapshot
+            if self._stat_signature() != self._signature:
+                return self._load()  # replaced while loading; not this snapshot's pipeline
+            self.snapshot = snapshot._replace(model=model)
+            return self.snapshot
+
+    @property
+    def model(self):
+        return self.snapshot.model
+
+    @property
+    def compiled(self):
+        return self.snapshot.compiled
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    @property
+    def loaded(self) -> bool:
+        snapshot = self.snapshot
+        return snapshot.model is not None or snapshot.compiled is not None
+
+    def current(self) -> ModelSnapshot:
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self._stat_signature() != self._signature:
+                self.load()
+        return self.snapshot
+
+    def ready(self) -> bool:
+        # Whether anything can score requests, without loading the pipeline
+        self.current()
+        return self.loaded
+
+    def get(self):
+        # The sklearn pipeline, loaded on first use when serving mapped tables
+        snapshot = self.current()
+        if snapshot.model is None and snapshot.compiled is not None:
+            snapshot = self._with_pipeline()
+        return snapshot.model
+
+    def predictor(self, rows: int) -> tuple:
+        # (version, model): the compiled model for small batches, otherwise
+        # the sklearn pipeline, both from one snapshot
+        snapshot = self.current()
+        if snapshot.compiled is not None and rows <= COMPILED_MAX_ROWS:
+            return snapshot.version, snapshot.compiled
+        if snapshot.model is None and snapshot.compiled is not None:
+            snapshot = self._with_pipeline()
+            if snapshot.model is None:
+                # Same predictions, only slower on large batches
+                return snapshot.version, snapshot.compiled
+        return snapshot.version, snapshot.model
+
+    def info(self) -> dict:
+        return {
+            "path": self.path,
+            "loaded": self.loaded,
+            "pipeline_loaded": self.model is not None,
+            "version": self.version,
+            "registry_version": self.registry_version,
+            "loaded_at": self.loaded_at,
+            "mmap_mode": self.mmap_mode,
+            "load_seconds": self.load_seconds,
+            "rss_mb": self.rss_mb,
+            "rss_delta_mb": self.rss_delta_mb,
+            "last_error": self.last_error,
+            "compiled": self.compiled is not None,
+            "compiled_source": self.compiled_source,
+            "compile_error": self.compile_error,
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_model_store(path: str = MODEL_PATH) -> ModelStore:
+    # One store per artifact per process, shared by every service module.
+    # MODEL_VERSION=<version> serves that registry version instead of path.
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = ModelStore(
+                resolve_model_path(path),
+                mmap_mode=os.environ.get("MODEL_MMAP_MODE") or None,
+                check_interval=float(os.environ.get("MODEL_RELOAD_INTERVAL", "5")),
+                compile=os.environ.get("MODEL_COMPILE", "1") == "1",
+            )
+            # MODEL_LAZY_LOAD=1 defers loading to the first current()
+            if os.environ.get("MODEL_LAZY_LOAD", "0") != "1":
+                store.load()
+            _stores[path] = store
+        return store
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from metrics import cache_lookup
+
+
+def feature_columns(model, frame: pd.DataFrame) -> list:
+    # The columns the fitted pipeline actually reads, in a canonical order
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        return sorted(frame.columns)
+    return sorted(name for name in names if name in frame.columns)
+
+
+def row_keys(frame: pd.DataFrame, columns: list) -> np.ndarray:
+    # 64-bit hash per row of the model-ready features. Numbers are hashed as
+    # float64 and everything else as text, so 20 and 20.0 or a categorical
+    # and a plain string column produce the same key
+    canonical = {}
+    for col in columns:
+        values = frame[col]
+        if is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            canonical[col] = values.astype("float64")
+        else:
+            canonical[col] = values.astype(str)
+    return pd.util.hash_pandas_object(pd.DataFrame(canonical), index=False).to_numpy()
+
+
+class PredictionCache:
+    """Bounded LRU of model outputs keyed by feature-row hash.
+
+    Entries belong to one model version; the first lookup with a different
+    version (i.e. after the artifact was replaced) empties the cache.
+    ``ttl`` (seconds) additionally expires entries by age.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl: Optional[float] = None, name: str = "predictions"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _lookup(self, keys: np.ndarray, version):
+        now = time.monotonic()
+        values = np.full(len(keys), np.nan)
+        found = np.zeros(len(keys), dtype=bool)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            for i, key in enumerate(keys.tolist()):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, expires = entry
+                if expires is not None and expires < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                values[i] = value
+                found[i] = True
+            hits = int(found.sum())
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return values, found
+
+    def _store(self, keys: np.ndarray, values: np.ndarray, version):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if version != self._version:
+                return  # model changed while predicting
+            for key, value in zip(keys.tolist(), values.tolist()):
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def predict(self, model, version, frame: pd.DataFrame,
+                predict_fn: Optional[Callable] = None) -> np.ndarray:
+        """``model.predict(frame)`` (or ``predict_fn(frame)``), served from the cache where possible.
+
+        Rows missing from the cache are predicted in one call, once per
+        distinct feature row.
+        """
+        predict_fn = predict_fn or model.predict
+        if self.max_entries <= 0 or len(frame) == 0:
+            return np.asarray(predict_fn(frame), dtype=float)
+
+        keys = row_keys(frame, feature_columns(model, frame))
+        values, found = self._lookup(keys, version)
+        hits = int(found.sum())
+        misses = len(keys) - hits
+        if hits:
+            cache_lookup(self.name, True, count=hits)
+        if misses:
+            cache_lookup(self.name, False, count=misses)
+            missing = np.flatnonzero(~found)
+            unique_keys, first, inverse = np.unique(keys[missing], return_index=True, return_inverse=True)
+            predicted = np.asarray(predict_fn(frame.iloc[missing[first]]), dtype=float)
+            values[missing] = predicted[inverse]
+            self._store(unique_keys, predicted, version)
+        return values
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "evictions": self.evictions,
+            "model_version": self._version,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache() -> PredictionCache:
+    # One cache per process, shared by every service module;
+    # PREDICTION_CACHE_SIZE=0 disables it
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            ttl = os.environ.get("PREDICTION_CACHE_TTL")
+            _cache = PredictionCache(
+                max_entries=int(os.environ.get("PREDICTION_CACHE_SIZE", "100000")),
+                ttl=float(ttl) if ttl else None,
+            )
+        return _cache
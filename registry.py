@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+from compiled_model import compile_pipeline, compiled_path
+
+# Directory of trained model versions, one subdirectory each
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "models")
+ARTIFACT_NAME = "student_performance_pipeline.joblib"
+
+
+def meta_path(model_path: str) -> str:
+    # Sidecar file recording which dataset (and registry version) the artifact came from
+    return os.path.splitext(model_path)[0] + ".meta.json"
+
+
+def read_meta(model_path: str) -> dict:
+    try:
+        with open(meta_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(path: str, data: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """Immutable, versioned model artifacts.
+
+    Each version is a directory holding the joblib pipeline, its
+    ``.meta.json`` (dataset hash, chosen parameters, CV results) and the
+    compiled model's ``.npy`` tables, which serving processes memory-map
+    instead of unpickling the forest (see compiled_model.py). Versions
+    are written to a temporary directory and renamed into place, so a
+    version that exists is always complete. ``promote`` marks a version as
+    the one to serve and publishes a copy at the serving path, where every
+    ModelStore picks it up through its usual hot reload.
+    """
+
+    def __init__(self, root: str = MODEL_REGISTRY_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @property
+    def _latest_path(self) -> str:
+        return os.path.join(self.root, "LATEST")
+
+    def artifact_path(self, version: str) -> str:
+        return os.path.join(self.root, version, ARTIFACT_NAME)
+
+    def new_version(self, dataset_sha256: Optional[str] = None) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return f"{stamp}-{dataset_sha256[:8]}" if dataset_sha256 else stamp
+
+    def register(self, pipeline, meta: dict, version: Optional[str] = None) -> str:
+        import joblib
+
+        if version is None:
+            version = self.new_version(meta.get("dataset_sha256"))
+            # Two trainings within the same second on the same data
+            base, n = version, 1
+            while os.path.exists(os.path.join(self.root, version)):
+                n += 1
+                version = f"{base}-{n}"
+        final_dir = os.path.join(self.root, version)
+        if os.path.exists(final_dir):
+            raise ValueError(f"Model version '{version}' already exists.")
+        tmp_dir = f"{final_dir}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir)
+        try:
+            artifact = os.path.join(tmp_dir, ARTIFACT_NAME)
+            joblib.dump(pipeline, artifact)
+            meta = {**meta, "registry_version": version}
+            try:
+                compiled = compile_pipeline(pipeline)
+            except ValueError as e:
+                print("❌ Could not compile model, it will be served by the sklearn pipeline only:", e)
+            else:
+                # Tied to this artifact; ModelStore checks both before mapping them
+                compiled.save(compiled_path(artifact), registry_version=version,
+                              artifact_size=os.path.getsize(artifact))
+                meta["compiled_tables"] = os.path.abspath(
+                    compiled_path(os.path.join(final_dir, ARTIFACT_NAME)))
+            write_json(meta_path(artifact), meta)
+            os.rename(tmp_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return version
+
+    def versions(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(self.artifact_path(name)))
+
+    def latest(self) -> Optional[str]:
+        try:
+            with open(self._latest_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def resolve(self, version: str = "latest") -> str:
+        # Artifact path for a version name or "latest"; KeyError if unknown
+        if version == "latest":
+            version = self.latest()
+            if version is None:
+                raise KeyError("No model version has been promoted.")
+        path = self.artifact_path(version)
+        if not os.path.exists(path):
+            raise KeyError(f"Unknown model version '{version}'.")
+        return path
+
+    def meta(self, version: str) -> dict:
+        return read_meta(self.resolve(version))
+
+    def promote(self, version: str, serving_path: Optional[str] = None):
+        source = self.resolve(version)
+        with self._lock:
+            if serving_path:
+                # Metadata first, so a store reloading the new artifact reads
+                # the matching sidecar. The copy is renamed over the served
+                # file, so no reader ever sees a partial artifact. The sidecar
+                # names this registry's compiled tables, which ModelStore maps.
+                meta = read_meta(source)
+                tables = compiled_path(source)
+                if os.path.isdir(tables):
+                    meta["compiled_tables"] = os.path.abspath(tables)
+                else:
+                    meta.pop("compiled_tables", None)
+                write_json(meta_path(serving_path), meta)
+                tmp_path = f"{serving_path}.{os.getpid()}.tmp"
+                shutil.copyfile(source, tmp_path)
+                os.replace(tmp_path, serving_path)
+            tmp_pointer = f"{self._latest_path}.{os.getpid()}.tmp"
+            with open(tmp_pointer, "w") as f:
+                f.write(version)
+            os.replace(tmp_pointer, self._latest_path)
+
+
+def resolve_model_path(default_path: str, version: Optional[str] = None) -> str:
+    # MODEL_VERSION pins the serving apps to one registry version; unset or
+    # "latest" serves default_path, where promote() publishes the chosen model
+    version = version or os.environ.get("MODEL_VERSION", "latest")
+    if version == "latest":
+        return default_path
+    return ModelRegistry().resolve(version)
@@ -0,0 +1,113 @@
+import operator
+from typing import List, Mapping, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+class Rule(NamedTuple):
+    column: str
+    op: str
+    threshold: float
+    message: str
+
+
+class RuleSet:
+    """Ordered advice rules evaluated as column masks.
+
+    ``evaluate`` turns every rule into one boolean mask over a whole frame and
+    assembles the tip lists from the distinct mask patterns, so the per-row
+    cost is a list copy. ``tips_for`` applies the same rules to a single
+    record. ``default`` is used when no rule fires.
+    """
+
+    def __init__(self, rules: List[Rule], default: Optional[str] = None):
+        unknown = [rule.op for rule in rules if rule.op not in OPERATORS]
+        if unknown:
+            raise ValueError(f"Unknown rule operators: {', '.join(unknown)}")
+        if len(rules) > 62:
+            raise ValueError("Too many rules for one RuleSet.")
+        self.rules = list(rules)
+        self.default = default
+
+    @property
+    def columns(self) -> List[str]:
+        return list(dict.fromkeys(rule.column for rule in self.rules))
+
+    def _tips(self, fired) -> List[str]:
+        tips = [rule.message for rule, hit in zip(self.rules, fired) if hit]
+        if not tips and self.default is not None:
+            tips.append(self.default)
+        return tips
+
+    def tips_for(self, record: Mapping) -> List[str]:
+        # Comparisons with NaN/None are False, as in the mask path
+        fired = []
+        for rule in self.rules:
+            value = record[rule.column]
+            fired.append(value is not None and bool(OPERATORS[rule.op](value, rule.threshold)))
+        return self._tips(fired)
+
+    def masks(self, data: Mapping, overrides: Optional[Mapping] = None) -> np.ndarray:
+        # One row per rule; ``overrides`` supplies columns not in ``data``
+        # (e.g. predictions held in a separate array)
+        overrides = overrides or {}
+        masks = []
+        for rule in self.rules:
+            values = overrides[rule.column] if rule.column in overrides else data[rule.column]
+            values = np.asarray(values, dtype=float)
+            masks.append(OPERATORS[rule.op](values, rule.threshold))
+        return np.vstack(masks) if masks else np.zeros((0, len(data)), dtype=bool)
+
+    def evaluate(self, data: Mapping, overrides: Optional[Mapping] = None) -> List[List[str]]:
+        masks = self.masks(data, overrides)
+        if not masks.size:
+            return [self._tips([]) for _ in range(len(data))]
+
+        # Encode each row's fired rules as a bit pattern and build the tip
+        # list once per distinct pattern
+        weights = np.left_shift(1, np.arange(len(self.rules), dtype=np.int64))
+        codes = weights @ masks.astype(np.int64)
+        patterns, inverse = np.unique(codes, return_inverse=True)
+        tips = [self._tips([(int(code) >> i) & 1 for i in range(len(self.rules))]) for code in patterns]
+        return [list(tips[i]) for i in inverse]
+
+
+def compare_to_average(values: pd.Series, average: float) -> np.ndarray:
+    # "Above Average"/"Below Average"/"Average" per value; NaN counts as Average
+    values = values.to_numpy(dtype=float)
+    return np.select([values > average, values < average],
+                     ["Above Average", "Below Average"], "Average")
+
+
+# Predicted scores below this are "at risk"
+AT_RISK_SCORE = 50
+
+# Advice returned by the prediction API
+ADVICE_LOW_ATTENDANCE = "Your attendance is below average. Try to attend more classes."
+ADVICE_LOW_STUDY = "Consider increasing your study hours to improve your score."
+ADVICE_AT_RISK = "You are currently at risk. Seek additional help and support."
+ADVICE_ON_TRACK = "Keep up the good work!"
+
+ADVICE_RULES = RuleSet([
+    Rule("Attendance (%)", "<", 75, ADVICE_LOW_ATTENDANCE),
+    Rule("Study_Hours_per_Week", "<", 10, ADVICE_LOW_STUDY),
+    Rule("Predicted_Score", "<", AT_RISK_SCORE, ADVICE_AT_RISK),
+    Rule("Predicted_Score", ">=", AT_RISK_SCORE, ADVICE_ON_TRACK),
+])
+
+# Improvement roadmap for student insights
+ROADMAP_RULES = RuleSet([
+    Rule("Attendance (%)", "<", 75, "Improve class attendance."),
+    Rule("Study_Hours_per_Week", "<", 10, "Increase study hours."),
+    Rule("Predicted_Score", "<", AT_RISK_SCORE, "Seek academic support."),
+], default="Maintain current effort and stay consistent.")
@@ -1,10 +1,13 @@
-from fastapi import FastAPI, File, UploadFile, Form
+from fastapi import FastAPI, File, UploadFile, Form, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import numpy as np
 import pandas as pd
-from io import BytesIO
-import os
-import json
+
+from ingest import read_columns, read_frame, remove_quietly, sniff_kind, spool_upload
+from metrics import instrument, stage
+from student_store import MARK_KEY, STUDENT_COLUMNS, create_store
 
 app = FastAPI()
 
@@ -16,92 +19,162 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DATA_DIR = "student_data"
-
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR)
+# Request latency/size metrics, stage timers and /metrics
+instrument(app, "student")
 
-def get_student_file_path(student_number: str) -> str:
-    safe_student = student_number.replace("/", "_")  # basic sanitize
-    return os.path.join(DATA_DIR, f"{safe_student}.json")
+# Pluggable mark storage: JSON files (default) or SQLite, see student_store.py
+store = create_store()
 
 def load_student_data(student_number: str) -> pd.DataFrame:
-    path = get_student_file_path(student_number)
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            records = json.load(f)
-        return pd.DataFrame(records)
-    else:
-        return pd.DataFrame()
+    return store.load(student_number)
 
 def save_student_data(student_number: str, df: pd.DataFrame):
-    path = get_student_file_path(student_number)
-    df.to_json(path, orient="records")
+    store.save(student_number, df)
+
+def group_bounds(df: pd.DataFrame):
+    # After sorting by (Module Name, Type, Number) each group is a contiguous
+    # block of rows; returns the block starts/ends and which rows have a key
+    keys = df[['Module Name', 'Type']]
+    keyed = keys.notna().all(axis=1).to_numpy()
+    starts = np.flatnonzero(keys.ne(keys.shift()).any(axis=1).to_numpy())
+    ends = np.append(starts[1:], len(df))
+    return starts, ends, keyed
+
+def running_average(scores: np.ndarray, start: int, first: int, end: int) -> np.ndarray:
+    # Running mean for rows first..end of the group starting at start, using a
+    # plain sequential cumsum so results (and NaN propagation) match
+    # sum(scores) / len(scores) exactly
+    prefix = np.cumsum(scores[start:first])[-1] if first > start else 0.0
+    totals = np.cumsum(np.concatenate(([prefix], scores[first:end])))[1:]
+    return totals / np.arange(first - start + 1, end - start + 1)
 
 def recalc_avg_feedback(df: pd.DataFrame) -> pd.DataFrame:
     df = df.sort_values(by=['Module Name', 'Type', 'Number']).reset_index(drop=True)
-    df['AVG'] = 0.0
-    df['Feedback'] = ''
-
-    grouped = df.groupby(['Module Name', 'Type'])
-    for (module, typ), group in grouped:
-        scores = []
-        idxs = group.index.tolist()
-        for i, idx in enumerate(idxs):
-            score = df.at[idx, 'Score']
-            scores.append(score)
-            avg = sum(scores) / len(scores)
-            df.at[idx, 'AVG'] = round(avg, 1)
-            df.at[idx, 'Feedback'] = "At Risk" if avg < 55 else "Not at Risk"
+    starts, ends, keyed = group_bounds(df)
+
+    scores = df['Score'].to_numpy(dtype=float)
+    running = np.full(len(df), np.nan)
+    for start, end in zip(starts, ends):
+        if keyed[start]:
+            running[start:end] = running_average(scores, start, start, end)
+
+    # Rows without a module/type belong to no group and keep the defaults
+    df['AVG'] = np.where(keyed, np.round(running, 1), 0.0)
+    df['Feedback'] = np.where(keyed, np.where(running < 55, "At Risk", "Not at Risk"), '')
     return df
 
+def merge_marks(existing: pd.DataFrame, new_df: pd.DataFrame):
+    """Upsert new marks into a student's (sorted, averaged) history.
+
+    Returns the combined frame and the rows whose Score, AVG or Feedback
+    changed. Running averages are only recomputed from the first affected
+    row of each affected (Module Name, Type) group onwards.
+    """
+    new_df = new_df.drop_duplicates(subset=MARK_KEY, keep='last')
+    existing = existing.drop_duplicates(subset=MARK_KEY, keep='last')
+    if existing.empty:
+        combined = recalc_avg_feedback(new_df)[STUDENT_COLUMNS]
+        return combined, combined
+
+    # Keep only rows that are new or carry a different score
+    previous = existing.set_index(MARK_KEY)['Score'].reindex(pd.MultiIndex.from_frame(new_df[MARK_KEY]))
+    new_scores = new_df['Score'].to_numpy()
+    changed = previous.isna().to_numpy() | (previous.to_numpy() != new_scores)
+    updates = new_df[changed]
+    if updates.empty:
+        return existing, existing.iloc[0:0]
+
+    update_keys = pd.MultiIndex.from_frame(updates[MARK_KEY])
+    replaced = pd.MultiIndex.from_frame(existing[MARK_KEY]).isin(update_keys)
+    combined = pd.concat([existing[~replaced], updates], ignore_index=True)
+    combined = combined.sort_values(by=['Module Name', 'Type', 'Number']).reset_index(drop=True)
+
+    starts, ends, keyed = group_bounds(combined)
+    affected = pd.MultiIndex.from_frame(combined[MARK_KEY]).isin(update_keys)
+    scores = combined['Score'].to_numpy(dtype=float)
+    avg = combined['AVG'].to_numpy(dtype=float, copy=True)
+    feedback = combined['Feedback'].to_numpy(dtype=object, copy=True)
+    touched = affected.copy()
+
+    for start, end in zip(starts, ends):
+        hits = np.flatnonzero(affected[start:end])
+        if not hits.size:
+            continue
+        first = start + hits[0]
+        touched[first:end] = True
+        if not keyed[start]:
+            avg[first:end] = 0.0
+            feedback[first:end] = ''
+            continue
+        running = running_average(scores, start, first, end)
+        avg[first:end] = np.round(running, 1)
+        feedback[first:end] = np.where(running < 55, "At Risk", "Not at Risk")
+
+    combined['AVG'] = avg
+    combined['Feedback'] = feedback
+    combined = combined[STUDENT_COLUMNS]
+    return combined, combined[touched]
+
+def apply_marks_upload(student_number: str, path: str, kind: str):
+    # Parse, merge and store one upload; pandas and file work, so it runs
+    # in the threadpool rather than on the event loop
+    required_cols = {'Full Name', 'Module Name', 'Type', 'Number', 'Score'}
+    if not required_cols.issubset(read_columns(path, kind)):
+        return JSONResponse(status_code=400, content={"error": f"File must contain columns: {', '.join(required_cols)}"}), False
+
+    # Only the first sheet and the needed columns are parsed
+    with stage("student", "parse"):
+        new_df = read_frame(path, kind, usecols=list(required_cols))
+
+    new_df['Student Number'] = student_number
+
+    with store.lock(student_number):
+        with stage("student", "load"):
+            existing_df = load_student_data(student_number)
+        with stage("student", "merge", rows=len(new_df)):
+            combined_df, changed_df = merge_marks(existing_df, new_df)
+        with stage("student", "store", rows=len(changed_df)):
+            needs_compaction = store.record_changes(student_number, combined_df, changed_df)
+
+    # The full table, as before; only the stored log is written incrementally
+    with stage("student", "serialize"):
+        data = combined_df.to_dict(orient="records")
+    return {
+        "data": data,
+        "rows": len(combined_df),
+        "columns": len(combined_df.columns),
+        "changed": len(changed_df),
+        "message": f"Upload successful. {len(combined_df)} rows processed for student {student_number}."
+    }, needs_compaction
+
 @app.post("/upload_student_marks/")
 async def upload_student_marks(
+    background_tasks: BackgroundTasks,
     student_number: str = Form(...),
     file: UploadFile = File(...)
 ):
+    path = None
     try:
-        content = await file.read()
+        path = await spool_upload(file)
 
-        if file.filename.endswith('.csv'):
-            new_df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith(('.xls', '.xlsx')):
-            new_df = pd.read_excel(BytesIO(content))
-        else:
+        # The format comes from the content, not the file name
+        kind = sniff_kind(path, file.filename)
+        if kind is None:
             return JSONResponse(status_code=400, content={"error": "Unsupported file type. Upload a .csv or .xlsx file."})
 
-        required_cols = {'Full Name', 'Module Name', 'Type', 'Number', 'Score'}
-        if not required_cols.issubset(new_df.columns):
-            return JSONResponse(status_code=400, content={"error": f"File must contain columns: {', '.join(required_cols)}"})
-
-        new_df['Student Number'] = student_number
-
-        existing_df = load_student_data(student_number)
-        if not existing_df.empty:
-            combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-            combined_df = combined_df.drop_duplicates(
-                subset=['Student Number', 'Full Name', 'Module Name', 'Type', 'Number'],
-                keep='last'
-            )
-        else:
-            combined_df = new_df
-
-        combined_df = recalc_avg_feedback(combined_df)
-        combined_df = combined_df[['Student Number', 'Full Name', 'Module Name', 'Type', 'Number', 'Score', 'AVG', 'Feedback']]
-        save_student_data(student_number, combined_df)
-
-        return {
-            "data": combined_df.to_dict(orient="records"),
-            "rows": len(combined_df),
-            "columns": len(combined_df.columns),
-            "message": f"Upload successful. {len(combined_df)} rows processed for student {student_number}."
-        }
+        response, needs_compaction = await run_in_threadpool(apply_marks_upload, student_number, path, kind)
+        if needs_compaction:
+            background_tasks.add_task(store.compact, student_number)
+        return response
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"An error occurred: {str(e)}"})
+    finally:
+        if path:
+            remove_quietly(path)
 
 @app.get("/get_student_data/{student_number}")
-async def get_student_data(student_number: str):
+def get_student_data(student_number: str):
     try:
         df = load_student_data(student_number)
         return {
@@ -111,3 +184,15 @@ async def get_student_data(student_number: str):
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"An error occurred: {str(e)}"})
 
+@app.get("/modules/{module_name}/at-risk")
+def get_module_at_risk(module_name: str):
+    # Students whose latest running average in the module is below the at-risk line
+    try:
+        df = store.at_risk(module_name)
+        return {
+            "module": module_name,
+            "count": len(df),
+            "data": df.to_dict(orient="records"),
+        }
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"An error occurred: {str(e)}"})
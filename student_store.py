@@ -0,0 +1,357 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from metrics import cache_lookup
+
+# Rows that identify one mark; a re-upload with the same key replaces it
+MARK_KEY = ['Student Number', 'Full Name', 'Module Name', 'Type', 'Number']
+STUDENT_COLUMNS = ['Student Number', 'Full Name', 'Module Name', 'Type', 'Number', 'Score', 'AVG', 'Feedback']
+
+DATA_DIR = "student_data"
+
+
+class StudentStore(ABC):
+    """Storage for per-student mark histories.
+
+    ``load``/``save`` read and replace one student's whole history,
+    ``record_changes`` persists the rows an upload touched and ``at_risk``
+    answers module-level queries across all students.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def lock(self, student_number: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(student_number, threading.Lock())
+
+    @abstractmethod
+    def load(self, student_number: str) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def save(self, student_number: str, df: pd.DataFrame):
+        ...
+
+    @abstractmethod
+    def record_changes(self, student_number: str, combined: pd.DataFrame, changed: pd.DataFrame) -> bool:
+        # Returns True when the student's storage should be compacted
+        ...
+
+    def compact(self, student_number: str):
+        pass
+
+    @abstractmethod
+    def student_numbers(self) -> list:
+        ...
+
+    def module_students(self, module_name: str) -> list:
+        # Students who may have marks in the module; all of them unless a
+        # backend keeps an index
+        return self.student_numbers()
+
+    def at_risk(self, module_name: str) -> pd.DataFrame:
+        # Latest mark per (student, type) in the module whose running average is at risk
+        frames = [self.load(number) for number in self.module_students(module_name)]
+        frames = [df[df['Module Name'] == module_name] for df in frames if not df.empty]
+        if not frames:
+            return pd.DataFrame(columns=STUDENT_COLUMNS)
+        module = pd.concat(frames, ignore_index=True)
+        latest = module.sort_values('Number').groupby(
+            ['Student Number', 'Full Name', 'Type'], sort=False).tail(1)
+        return latest[latest['Feedback'] == 'At Risk'].sort_values(['Student Number', 'Type'])
+
+
+class JsonStudentStore(StudentStore):
+    """One ``<number>.json`` base file per student plus an append-only log.
+
+    Changed rows are appended to ``<number>.log.jsonl`` and replayed on load;
+    ``compact`` folds the log back into the base file. ``_modules/<module>/``
+    holds an empty marker file per student with marks in that module, so
+    ``at_risk`` only loads those students. Marks are never removed, so the
+    markers only ever need adding.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR, compact_log_bytes: int = 256 * 1024, cache_size: int = 256):
+        super().__init__()
+        self.data_dir = data_dir
+        self.compact_log_bytes = compact_log_bytes
+        self.cache_size = cache_size
+        # Recently used student frames, validated against the files' stat signature
+        self._frames = OrderedDict()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def file_path(self, student_number: str) -> str:
+        safe_student = student_number.replace("/", "_")  # basic sanitize
+        return os.path.join(self.data_dir, f"{safe_student}.json")
+
+    def log_path(self, student_number: str) -> str:
+        return self.file_path(student_number)[:-len(".json")] + ".log.jsonl"
+
+    @property
+    def index_dir(self) -> str:
+        return os.path.join(self.data_dir, "_modules")
+
+    def _index(self, student_number: str, df: pd.DataFrame):
+        if df.empty or 'Module Name' not in df.columns:
+            return
+        for module in df['Module Name'].dropna().unique():
+            module_dir = os.path.join(self.index_dir, quote(str(module), safe=""))
+            # Named like the student's files, as student_numbers() reports them
+            stem = os.path.basename(self.file_path(student_number))[:-len(".json")]
+            marker = os.path.join(module_dir, quote(stem, safe=""))
+            if not os.path.exists(marker):
+                os.makedirs(module_dir, exist_ok=True)
+                open(marker, "a").close()
+
+    def _build_index(self):
+        # Indexes students stored before the index existed; runs once
+        complete = os.path.join(self.index_dir, ".complete")
+        if os.path.exists(complete):
+            return
+        for number in self.student_numbers():
+            self._index(number, self.load(number))
+        os.makedirs(self.index_dir, exist_ok=True)
+        open(complete, "a").close()
+
+    def module_students(self, module_name: str) -> list:
+        self._build_index()
+        module_dir = os.path.join(self.index_dir, quote(str(module_name), safe=""))
+        try:
+            return sorted(unquote(name) for name in os.listdir(module_dir))
+        except OSError:
+            return []
+
+    @staticmethod
+    def _read_records(path: str) -> list:
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as f:
+            if path.endswith(".json"):
+                return json.load(f)
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _signature(self, student_number: str):
+        log = self.log_path(student_number)
+        sig = []
+        for path in (self.file_path(student_number), log + ".compacting", log):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _remember(self, student_number: str, df: pd.DataFrame):
+        self._frames[student_number] = (self._signature(student_number), df)
+        self._frames.move_to_end(student_number)
+        while len(self._frames) > self.cache_size:
+            self._frames.popitem(last=False)
+
+    def load(self, student_number: str) -> pd.DataFrame:
+        cached = self._frames.get(student_number)
+        hit = cached is not None and cached[0] == self._signature(student_number)
+        cache_lookup("student_frames", hit)
+        if hit:
+            self._frames.move_to_end(student_number)
+            return cached[1]
+
+        log = self.log_path(student_number)
+        records = self._read_records(self.file_path(student_number))
+        replay = self._read_records(log + ".compacting") + self._read_records(log)
+        df = pd.DataFrame(records + replay)
+        if replay:
+            # Later log entries supersede earlier rows with the same key
+            df = df.drop_duplicates(subset=MARK_KEY, keep='last')
+            df = df.sort_values(by=['Module Name', 'Type', 'Number']).reset_index(drop=True)
+
+        self._remember(student_number, df)
+        return df
+
+    def save(self, student_number: str, df: pd.DataFrame):
+        path = self.file_path(student_number)
+        tmp_path = path + ".tmp"
+        df.to_json(tmp_path, orient="records")
+        os.replace(tmp_path, path)
+        self._index(student_number, df)
+
+    def record_changes(self, student_number: str, combined: pd.DataFrame, changed: pd.DataFrame) -> bool:
+        # Persist only the changed rows
+        log = self.log_path(student_number)
+        if not changed.empty:
+            payload = changed.to_json(orient="records", lines=True)
+            if not payload.endswith("\n"):
+                payload += "\n"
+            with open(log, "a") as f:
+                f.write(payload)
+            self._index(student_number, changed)
+        self._remember(student_number, combined)
+        return os.path.exists(log) and os.path.getsize(log) > self.compact_log_bytes
+
+    def compact(self, student_number: str):
+        # The log is renamed first so uploads arriving meanwhile start a
+        # fresh log instead of being lost
+        log = self.log_path(student_number)
+        with self.lock(student_number):
+            if not os.path.exists(log + ".compacting"):
+                if not os.path.exists(log):
+                    return
+                os.replace(log, log + ".compacting")
+            df = self.load(student_number)
+            current = pd.DataFrame(self._read_records(log))
+            if not current.empty:
+                # Rows appended after the rename stay in the live log
+                keys = pd.MultiIndex.from_frame(df[MARK_KEY])
+                df = df[~keys.isin(pd.MultiIndex.from_frame(current[MARK_KEY]))]
+            self.save(student_number, df[STUDENT_COLUMNS] if not df.empty else df)
+            os.remove(log + ".compacting")
+
+    def student_numbers(self) -> list:
+        numbers = set()
+        for path in glob.glob(os.path.join(self.data_dir, "*.json")) + \
+                glob.glob(os.path.join(self.data_dir, "*.log.jsonl")):
+            name = os.path.basename(path)
+            numbers.add(name[:-len(".log.jsonl")] if name.endswith(".log.jsonl") else name[:-len(".json")])
+        return sorted(numbers)
+
+
+class SQLiteStudentStore(StudentStore):
+    """All students in one SQLite database in WAL mode.
+
+    The primary key leads with the student number, and a second index on
+    (module, student, type, number) serves module-level queries without
+    touching other modules' rows.
+    """
+
+    COLUMNS = ["student_number", "full_name", "module_name", "type", "number", "score", "avg", "feedback"]
+
+    def __init__(self, path: str = os.path.join(DATA_DIR, "marks.db")):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS marks (
+                    student_number TEXT NOT NULL,
+                    full_name TEXT NOT NULL,
+                    module_name TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    number INTEGER NOT NULL,
+                    score REAL,
+                    avg REAL,
+                    feedback TEXT,
+                    PRIMARY KEY (student_number, full_name, module_name, type, number)
+                );
+                CREATE INDEX IF NOT EXISTS idx_marks_module
+                    ON marks (module_name, student_number, type, number);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside a writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _rows(df: pd.DataFrame) -> list:
+        frame = df[STUDENT_COLUMNS].astype(object)
+        frame = frame.where(pd.notnull(frame), None)
+        rows = []
+        for student, name, module, typ, number, score, avg, feedback in frame.itertuples(index=False):
+            rows.append((str(student), name, module, typ,
+                         None if number is None else int(number),
+                         None if score is None else float(score),
+                         None if avg is None else float(avg),
+                         feedback))
+        return rows
+
+    def _frame(self, cursor) -> pd.DataFrame:
+        rows = cursor.fetchall()
+        if not rows:
+            return pd.DataFrame()
+        return pd.DataFrame(rows, columns=STUDENT_COLUMNS)
+
+    def load(self, student_number: str) -> pd.DataFrame:
+        cursor = self._connect().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM marks WHERE student_number = ? "
+            "ORDER BY module_name, type, number",
+            (student_number,),
+        )
+        return self._frame(cursor)
+
+    def upsert(self, df: pd.DataFrame):
+        # Bulk upsert keyed on the primary key
+        if df.empty:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                f"INSERT INTO marks ({', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (student_number, full_name, module_name, type, number) DO UPDATE SET "
+                "score = excluded.score, avg = excluded.avg, feedback = excluded.feedback",
+                self._rows(df),
+            )
+
+    def save(self, student_number: str, df: pd.DataFrame):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM marks WHERE student_number = ?", (student_number,))
+            if not df.empty:
+                conn.executemany(
+                    f"INSERT INTO marks ({', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._rows(df),
+                )
+
+    def record_changes(self, student_number: str, combined: pd.DataFrame, changed: pd.DataFrame) -> bool:
+        self.upsert(changed)
+        return False
+
+    def student_numbers(self) -> list:
+        cursor = self._connect().execute("SELECT DISTINCT student_number FROM marks ORDER BY student_number")
+        return [row[0] for row in cursor.fetchall()]
+
+    def at_risk(self, module_name: str) -> pd.DataFrame:
+        cursor = self._connect().execute(
+            f"""
+            SELECT {', '.join('m.' + col for col in self.COLUMNS)}
+            FROM marks m
+            JOIN (
+                SELECT student_number, full_name, type, MAX(number) AS number
+                FROM marks WHERE module_name = ?
+                GROUP BY student_number, full_name, type
+            ) latest
+              ON m.student_number = latest.student_number AND m.full_name = latest.full_name
+             AND m.type = latest.type AND m.number = latest.number
+            WHERE m.module_name = ? AND m.feedback = 'At Risk'
+            ORDER BY m.student_number, m.type
+            """,
+            (module_name, module_name),
+        )
+        df = self._frame(cursor)
+        return df if not df.empty else pd.DataFrame(columns=STUDENT_COLUMNS)
+
+
+def create_store(backend: str = None) -> StudentStore:
+    # STUDENT_STORE=json (default) or sqlite; STUDENT_DB overrides the SQLite path
+    backend = (backend or os.environ.get("STUDENT_STORE", "json")).lower()
+    if backend == "sqlite":
+        return SQLiteStudentStore(os.environ.get("STUDENT_DB", os.path.join(DATA_DIR, "marks.db")))
+    if backend == "json":
+        return JsonStudentStore(DATA_DIR)
+    raise ValueError(f"Unknown student store backend '{backend}'.")
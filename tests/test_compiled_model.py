@@ -0,0 +1,109 @@
+"""CompiledPipeline must predict exactly what the sklearn pipeline predicts."""
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compiled_model import CompiledPipeline, compile_pipeline  # noqa: E402
+from ingest import downcast  # noqa: E402
+from train import build_pipeline  # noqa: E402
+
+TOLERANCE = 1e-9
+
+CATEGORIES = {
+    "Gender": ["Male", "Female"],
+    "Department": ["Computer Science", "Business", "Engineering", "Education"],
+    "Extracurricular_Activities": ["Yes", "No"],
+    "Internet_Access_at_Home": ["Yes", "No"],
+    "Parent_Education_Level": ["High School", "Bachelor's", "Master's", "PhD"],
+    "Family_Income_Level": ["Low", "Medium", "High"],
+    "Grade": list("ABCDF"),
+}
+NUMERIC = {
+    "Age": (18, 25), "Attendance (%)": (50, 100), "Midterm_Score": (30, 100),
+    "Final_Score": (30, 100), "Assignments_Avg": (30, 100), "Quizzes_Avg": (30, 100),
+    "Participation_Score": (0, 10), "Projects_Score": (30, 100), "Study_Hours_per_Week": (2, 30),
+    "Stress_Level (1-10)": (1, 10), "Sleep_Hours_per_Night": (4, 9),
+}
+
+
+def make_features(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {col: rng.choice(values, rows) for col, values in CATEGORIES.items()}
+    data.update({col: rng.uniform(low, high, rows).round(2) for col, (low, high) in NUMERIC.items()})
+    return pd.DataFrame(data)
+
+
+def make_pipeline(X: pd.DataFrame, seed: int = 42):
+    # Same ColumnTransformer + RandomForestRegressor shape as train.py, smaller
+    y = (X["Midterm_Score"] * 0.6 + X["Participation_Score"]
+         + np.random.default_rng(seed).normal(0, 3, len(X)))
+    pipeline = build_pipeline(list(NUMERIC))
+    pipeline.set_params(regressor__n_estimators=10, regressor__max_depth=8, regressor__n_jobs=1)
+    return pipeline.fit(X, y)
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    return make_pipeline(make_features(1500, seed=1))
+
+
+@pytest.fixture(scope="module")
+def pipeline_with_missing():
+    # Trees fitted on NaNs learn which side missing values go to
+    X = make_features(1500, seed=2)
+    X.loc[X.index[::7], "Study_Hours_per_Week"] = np.nan
+    X.loc[X.index[::11], "Final_Score"] = np.nan
+    return make_pipeline(X)
+
+
+def assert_parity(pipeline, compiled: CompiledPipeline, frame: pd.DataFrame):
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Found unknown categories")
+        expected = pipeline.predict(frame)
+    records = frame.astype(object).to_dict(orient="records")
+
+    np.testing.assert_allclose(compiled.predict(frame), expected, rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(compiled.predict_records(records), expected, rtol=0, atol=TOLERANCE)
+    singles = [compiled.predict_one(record) for record in records[:50]]
+    np.testing.assert_allclose(singles, expected[:50], rtol=0, atol=TOLERANCE)
+
+
+def test_matches_pipeline(pipeline):
+    assert_parity(pipeline, compile_pipeline(pipeline), make_features(400, seed=3))
+
+
+def test_category_dtype_columns(pipeline):
+    # What ingest.downcast hands to the model after an upload
+    frame = downcast(make_features(400, seed=4))
+    assert isinstance(frame["Department"].dtype, pd.CategoricalDtype)
+    assert_parity(pipeline, compile_pipeline(pipeline), frame)
+
+
+def test_unseen_categories(pipeline):
+    frame = make_features(200, seed=5)
+    frame.loc[frame.index[:20], "Department"] = "Architecture"
+    frame.loc[frame.index[10:30], "Grade"] = "E"
+    assert_parity(pipeline, compile_pipeline(pipeline), frame)
+    assert_parity(pipeline, compile_pipeline(pipeline), downcast(frame))
+
+
+def test_nan_numerics(pipeline, pipeline_with_missing):
+    frame = make_features(300, seed=6)
+    frame.loc[frame.index[::5], "Study_Hours_per_Week"] = np.nan
+    frame.loc[frame.index[::3], "Final_Score"] = np.nan
+    frame.loc[frame.index[::4], "Age"] = np.nan
+    for fitted in (pipeline, pipeline_with_missing):
+        assert_parity(fitted, compile_pipeline(fitted), frame)
+
+
+def test_saved_tables(pipeline, tmp_path):
+    # The memory-mapped tables model_store serves predict the same
+    path = str(tmp_path / "model.compiled")
+    compile_pipeline(pipeline).save(path)
+    assert_parity(pipeline, CompiledPipeline.load(path, mmap_mode="r"), make_features(200, seed=7))
@@ -0,0 +1,257 @@
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Directory holding one append-only ``<name>.ts`` file per series;
+# set TIMESERIES_DIR="" to keep series in memory only
+TIMESERIES_DIR = os.environ.get("TIMESERIES_DIR", "timeseries")
+
+# One fixed-size record per point: date as int64 nanoseconds since the epoch (UTC)
+RECORD = np.dtype([("date", "<i8"), ("x", "<f8"), ("y", "<f8")])
+
+DOWNSAMPLE_METHODS = ("lttb", "mean")
+
+
+def parse_dates(values) -> np.ndarray:
+    # Date strings -> int64 nanoseconds, naive values taken as UTC.
+    # Raises ValueError for anything pandas cannot parse.
+    try:
+        parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True)
+    except (ValueError, TypeError):
+        parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True, format="mixed")
+    if parsed.isna().any():
+        raise ValueError("Missing date.")
+    return parsed.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view("i8")
+
+
+def format_dates(dates: np.ndarray) -> list:
+    values = dates.view("datetime64[ns]")
+    # Date-only series round-trip as plain dates
+    unit = "D" if len(dates) and not (dates % 86_400_000_000_000).any() else "s"
+    return np.datetime_as_string(values, unit=unit).tolist()
+
+
+def lttb(dates: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points that keep the series' shape.
+
+    ``dates`` must be sorted. The first and last points are always kept; each
+    bucket in between contributes the point forming the largest triangle with
+    the previously chosen point and the next bucket's average.
+    """
+    n = len(dates)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 1)], dtype=np.int64)
+    t = (dates - dates[0]).astype(np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_t = t[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((t[a] - avg_t) * (y[start:end] - y[a]) - (t[a] - t[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def bucket_means(dates: np.ndarray, x: np.ndarray, y: np.ndarray, buckets: int):
+    # Equal-width time buckets; each non-empty bucket becomes its mean point
+    if len(dates) <= buckets:
+        return dates, x, y
+    offsets = (dates - dates[0]).astype(np.float64)
+    span = offsets[-1] or 1.0
+    index = np.minimum((offsets / span * buckets).astype(np.int64), buckets - 1)
+    counts = np.bincount(index, minlength=buckets)
+    keep = counts > 0
+    counts = counts[keep]
+
+    def mean(values):
+        return np.bincount(index, weights=values, minlength=buckets)[keep] / counts
+
+    mean_dates = dates[0] + np.round(mean(offsets)).astype(np.int64)
+    return mean_dates, mean(x), mean(y)
+
+
+class TimeSeriesStore:
+    """One series of (date, x, y) points held as sorted NumPy arrays.
+
+    Points are appended to a binary log of fixed-size records, so adding one
+    point writes 24 bytes instead of the whole history. Other worker
+    processes pick up appends by reading only the log's new tail; ``replace``
+    rewrites the file and readers reload it. Reads take the current arrays
+    with one attribute access and never see a partial append.
+    """
+
+    def __init__(self, name: str, data_dir: Optional[str] = TIMESERIES_DIR):
+        self.name = name
+        self.data_dir = data_dir or None
+        # (dates, x, y) views of length n over buffers with spare capacity
+        self._view = (np.empty(0, "i8"), np.empty(0), np.empty(0))
+        self._buffers = None
+        self._file_signature = None  # (inode, bytes read)
+        self._lock = threading.Lock()
+        if self.data_dir:
+            os.makedirs(self.data_dir, exist_ok=True)
+            with self._lock:
+                self._refresh()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.data_dir, f"{self.name}.ts")
+
+    def _set(self, records: np.ndarray, reset: bool = False):
+        # Merges records into the in-memory arrays, keeping them sorted by date
+        if reset:
+            # Never write into buffers that readers of the old data still hold
+            self._view, self._buffers = (np.empty(0, "i8"), np.empty(0), np.empty(0)), None
+        dates, x, y = self._view
+        n = len(dates)
+        if not len(records):
+            return
+        new_dates, new_x, new_y = records["date"], records["x"], records["y"]
+        in_order = (np.all(new_dates[1:] >= new_dates[:-1])
+                    and (n == 0 or new_dates[0] >= dates[-1]))
+        buffers = self._buffers
+        if in_order and buffers is not None and n + len(records) <= len(buffers[0]):
+            # Fast path: write past the end of the shared buffers; readers
+            # holding the old view only ever look at the first n entries
+            for buffer, values in zip(buffers, (new_dates, new_x, new_y)):
+                buffer[n:n + len(records)] = values
+            total = n + len(records)
+        else:
+            merged_dates = np.concatenate([dates, new_dates])
+            merged_x = np.concatenate([x, new_x])
+            merged_y = np.concatenate([y, new_y])
+            if not in_order:
+                order = np.argsort(merged_dates, kind="stable")
+                merged_dates, merged_x, merged_y = merged_dates[order], merged_x[order], merged_y[order]
+            total = len(merged_dates)
+            capacity = max(1024, total * 2)
+            buffers = (np.empty(capacity, "i8"), np.empty(capacity), np.empty(capacity))
+            for buffer, values in zip(buffers, (merged_dates, merged_x, merged_y)):
+                buffer[:total] = values
+            self._buffers = buffers
+        self._view = (buffers[0][:total], buffers[1][:total], buffers[2][:total])
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size
+
+    def _refresh(self):
+        # Called with the lock held; loads whatever other processes wrote
+        stat = self._stat()
+        if stat is None:
+            if self._file_signature is not None:
+                self._set(np.empty(0, RECORD), reset=True)
+                self._file_signature = None
+            return
+        inode, size = stat
+        size -= size % RECORD.itemsize  # ignore a record still being written
+        if self._file_signature is not None and self._file_signature[0] == inode:
+            offset = self._file_signature[1]
+            if size <= offset:
+                return
+            reset = False
+        else:
+            offset, reset = 0, True
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            records = np.frombuffer(f.read(size - offset), dtype=RECORD)
+        self._set(records, reset=reset)
+        self._file_signature = (inode, size)
+
+    def _to_records(self, dates, x, y) -> np.ndarray:
+        records = np.empty(len(dates), dtype=RECORD)
+        records["date"], records["x"], records["y"] = dates, x, y
+        return records
+
+    def append(self, dates, x, y) -> int:
+        records = self._to_records(dates, x, y)
+        with self._lock:
+            if self.data_dir:
+                self._refresh()
+                # One O_APPEND write per batch, so concurrent writers never interleave records
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, records.tobytes())
+                finally:
+                    os.close(fd)
+                if self._file_signature is None:
+                    self._file_signature = (self._stat()[0], 0)  # file was just created
+                self._refresh()
+            else:
+                self._set(records)
+            return len(self._view[0])
+
+    def replace(self, dates, x, y) -> int:
+        records = self._to_records(dates, x, y)
+        with self._lock:
+            if self.data_dir:
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                records.tofile(tmp_path)
+                os.replace(tmp_path, self.path)
+                self._file_signature = None
+                self._refresh()
+            else:
+                self._set(records, reset=True)
+            return len(self._view[0])
+
+    def arrays(self):
+        if self.data_dir:
+            stat = self._stat()
+            if stat is None or self._file_signature is None or stat[0] != self._file_signature[0] \
+                    or stat[1] - stat[1] % RECORD.itemsize != self._file_signature[1]:
+                with self._lock:
+                    self._refresh()
+        return self._view
+
+    def __len__(self) -> int:
+        return len(self.arrays()[0])
+
+    def query(self, start=None, end=None, max_points: Optional[int] = None, method: str = "lttb") -> dict:
+        """Points with ``start <= date <= end``, downsampled to at most ``max_points``.
+
+        ``method`` is ``"lttb"`` (keeps real points that preserve the shape
+        of y over time) or ``"mean"`` (equal-width time buckets averaged).
+        """
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"Unknown downsampling method '{method}'.")
+        dates, x, y = self.arrays()
+        lo = 0 if start is None else int(np.searchsorted(dates, parse_dates([start])[0], side="left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, parse_dates([end])[0], side="right"))
+        dates, x, y = dates[lo:hi], x[lo:hi], y[lo:hi]
+        matched = len(dates)
+        if max_points is not None and matched > max_points:
+            if method == "lttb":
+                keep = lttb(dates, y, max_points)
+                dates, x, y = dates[keep], x[keep], y[keep]
+            else:
+                dates, x, y = bucket_means(dates, x, y, max_points)
+        else:
+            method = None
+        return {"dates": dates, "x": x, "y": y, "matched": matched, "downsampled": method}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_timeseries_store(name: str) -> TimeSeriesStore:
+    # One store per series name per process, shared by every service module
+    with _stores_lock:
+        store = _stores.get(name)
+        if store is None:
+            store = TimeSeriesStore(name)
+            _stores[name] = store
+        return store
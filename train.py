@@ -0,0 +1,281 @@
+import argparse
+import hashlib
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold, ParameterGrid, train_test_split
+
+from registry import MODEL_REGISTRY_DIR, ModelRegistry, read_meta
+
+DATASET_PATH = "Students_Grading_Dataset.csv"
+MODEL_PATH = "student_performance_pipeline.joblib"
+
+TARGET_COL = 'Total_Score_Recalculated'
+DROP_COLS = ['Total_Score', TARGET_COL, 'Student_ID', 'First_Name', 'Last_Name', 'Email']
+CATEGORICAL_COLS = ['Gender', 'Department', 'Extracurricular_Activities',
+                    'Internet_Access_at_Home', 'Parent_Education_Level', 'Family_Income_Level', 'Grade']
+
+# Regressor hyperparameters tried by --search; "small" is a quick sanity run
+SEARCH_GRIDS = {
+    "small": {"n_estimators": [50], "max_depth": [None, 12]},
+    "default": {
+        "n_estimators": [100, 200],
+        "max_depth": [None, 12, 20],
+        "min_samples_leaf": [1, 3],
+        "max_features": [1.0, 0.5],
+    },
+}
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_dataset(path: str = DATASET_PATH) -> pd.DataFrame:
+    data = pd.read_csv(path)
+    data.columns = data.columns.str.strip()
+    return data.dropna()
+
+
+def split_features(data: pd.DataFrame):
+    X = data.drop(columns=DROP_COLS)
+    y = data[TARGET_COL]
+    return X, y
+
+
+def numeric_columns(X: pd.DataFrame) -> list:
+    return [col for col in X.columns if col not in CATEGORICAL_COLS]
+
+
+def build_pipeline(numeric_cols: list) -> Pipeline:
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ('cat', OneHotEncoder(drop='first', handle_unknown='ignore'), CATEGORICAL_COLS),
+            ('num', StandardScaler(), numeric_cols)
+        ]
+    )
+    return Pipeline([
+        ('preprocessor', preprocessor),
+        ('regressor', RandomForestRegressor(random_state=42))
+    ])
+
+
+def train(dataset_path: str = DATASET_PATH, model_path: str = MODEL_PATH,
+          registry_dir: str = MODEL_REGISTRY_DIR) -> Pipeline:
+    # Registered and promoted like a search result, so the registry's LATEST
+    # always names the model served at model_path
+    data = load_dataset(dataset_path)
+    X, y = split_features(data)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    pipeline = build_pipeline(numeric_columns(X))
+    start = time.perf_counter()
+    pipeline.set_params(regressor__n_jobs=-1)  # fit the trees on every core
+    pipeline.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    # Serving predicts small batches, where a thread pool per call only adds latency
+    pipeline.set_params(regressor__n_jobs=None)
+
+    meta = {
+        "dataset_sha256": file_hash(dataset_path),
+        "rows": len(data),
+        "test_r2": round(float(pipeline.score(X_test, y_test)), 4),
+        "fit_seconds": round(fit_seconds, 3),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sklearn_version": sklearn.__version__,
+    }
+    registry = ModelRegistry(registry_dir)
+    version = registry.register(pipeline, meta)
+    # promote() writes the sidecar and renames the copy over model_path, so
+    # readers never load a half-written artifact
+    registry.promote(version, model_path)
+
+    print(f"✅ Trained {version} on {meta['rows']} rows in {meta['fit_seconds']}s "
+          f"(test R² {meta['test_r2']}) -> {model_path}")
+    return pipeline
+
+
+def trained_on(model_path: str = MODEL_PATH):
+    return read_meta(model_path).get("dataset_sha256")
+
+
+def load_or_train(dataset_path: str = DATASET_PATH, model_path: str = MODEL_PATH,
+                  dataset_sha256: str = None, registry_dir: str = MODEL_REGISTRY_DIR) -> Pipeline:
+    # Reuse the saved artifact unless the dataset has changed since it was trained
+    if dataset_sha256 is None:
+        dataset_sha256 = file_hash(dataset_path)
+    if os.path.exists(model_path) and trained_on(model_path) == dataset_sha256:
+        return joblib.load(model_path)
+    return train(dataset_path, model_path, registry_dir)
+
+
+def prepare_folds(X: pd.DataFrame, y: pd.Series, cv: int) -> list:
+    # The preprocessing does not depend on the regressor's parameters, so it
+    # is fitted once per fold and its output shared by every candidate
+    folds = []
+    for train_idx, test_idx in KFold(n_splits=cv, shuffle=True, random_state=42).split(X):
+        preprocessor = clone(build_pipeline(numeric_columns(X)).named_steps['preprocessor'])
+        X_train = preprocessor.fit_transform(X.iloc[train_idx])
+        folds.append({
+            "preprocessor": preprocessor,
+            "X_train": X_train,
+            "y_train": y.iloc[train_idx].to_numpy(),
+            "X_test": preprocessor.transform(X.iloc[test_idx]),
+            "y_test": y.iloc[test_idx].to_numpy(),
+            "sample": X.iloc[test_idx[:1]],
+        })
+    return folds
+
+
+def evaluate_candidate(params: dict, fold: dict, latency_repeats: int = 20) -> dict:
+    # One (candidate, fold) fit, run in a worker process
+    start = time.perf_counter()
+    regressor = RandomForestRegressor(random_state=42, n_jobs=1, **params)
+    regressor.fit(fold["X_train"], fold["y_train"])
+    fit_seconds = time.perf_counter() - start
+
+    predict_start = time.perf_counter()
+    predictions = regressor.predict(fold["X_test"])
+    batch_seconds = time.perf_counter() - predict_start
+
+    # Single-row latency through the whole pipeline, as /predict sees it
+    pipeline = Pipeline([('preprocessor', fold["preprocessor"]), ('regressor', regressor)])
+    timings = []
+    for _ in range(latency_repeats):
+        t0 = time.perf_counter()
+        pipeline.predict(fold["sample"])
+        timings.append(time.perf_counter() - t0)
+
+    return {
+        "r2": float(r2_score(fold["y_test"], predictions)),
+        "fit_seconds": fit_seconds,
+        "predict_ms_per_1k_rows": batch_seconds / len(predictions) * 1_000_000,
+        "single_row_ms": float(np.median(timings)) * 1000,
+        "wall_seconds": time.perf_counter() - start,
+    }
+
+
+def summarize(params: dict, results: list) -> dict:
+    scores = [r["r2"] for r in results]
+    return {
+        "params": params,
+        "mean_r2": round(float(np.mean(scores)), 4),
+        "std_r2": round(float(np.std(scores)), 4),
+        "mean_fit_seconds": round(float(np.mean([r["fit_seconds"] for r in results])), 3),
+        "wall_seconds": round(sum(r["wall_seconds"] for r in results), 3),
+        "predict_ms_per_1k_rows": round(float(np.mean([r["predict_ms_per_1k_rows"] for r in results])), 3),
+        "single_row_ms": round(float(np.median([r["single_row_ms"] for r in results])), 3),
+    }
+
+
+def search(dataset_path: str = DATASET_PATH, model_path: str = MODEL_PATH, grid: str = "default",
+           cv: int = 5, n_jobs: int = -1, max_latency_ms: float = None,
+           registry_dir: str = MODEL_REGISTRY_DIR, promote: bool = True) -> str:
+    """Cross-validated search over the regressor's parameters; returns the registered version.
+
+    Every (candidate, fold) fit runs as its own task in a process pool of
+    ``n_jobs`` workers. The best candidate by mean R² (among those whose
+    single-row latency is within ``max_latency_ms``, if given) is refitted
+    on the training split, scored on the held-out split and registered;
+    with ``promote`` it also replaces the served artifact at ``model_path``.
+    """
+    search_start = time.perf_counter()
+    data = load_dataset(dataset_path)
+    X, y = split_features(data)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    folds = prepare_folds(X_train, y_train, cv)
+    candidates = list(ParameterGrid(SEARCH_GRIDS[grid]))
+    tasks = [(params, fold) for params in candidates for fold in folds]
+    print(f"Searching {len(candidates)} candidates x {cv} folds ({len(tasks)} fits, n_jobs={n_jobs})...")
+    results = Parallel(n_jobs=n_jobs)(delayed(evaluate_candidate)(params, fold) for params, fold in tasks)
+
+    summaries = [summarize(params, results[i * cv:(i + 1) * cv]) for i, params in enumerate(candidates)]
+    summaries.sort(key=lambda s: (-s["mean_r2"], s["single_row_ms"]))
+    for s in summaries:
+        print(f"  R² {s['mean_r2']:.4f} ±{s['std_r2']:.4f}  fit {s['mean_fit_seconds']:7.2f}s  "
+              f"1 row {s['single_row_ms']:7.2f} ms  1k rows {s['predict_ms_per_1k_rows']:7.2f} ms  {s['params']}")
+
+    eligible = [s for s in summaries if max_latency_ms is None or s["single_row_ms"] <= max_latency_ms]
+    if not eligible:
+        raise ValueError(f"No candidate predicts a single row within {max_latency_ms} ms.")
+    best = eligible[0]
+
+    pipeline = build_pipeline(numeric_columns(X))
+    pipeline.set_params(**{f"regressor__{k}": v for k, v in best["params"].items()}, regressor__n_jobs=n_jobs)
+    start = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    pipeline.set_params(regressor__n_jobs=None)
+
+    meta = {
+        "dataset_sha256": file_hash(dataset_path),
+        "rows": len(data),
+        "test_r2": round(float(pipeline.score(X_test, y_test)), 4),
+        "fit_seconds": round(fit_seconds, 3),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": best["params"],
+        "cv_folds": cv,
+        "search_seconds": round(time.perf_counter() - search_start, 3),
+        "max_latency_ms": max_latency_ms,
+        "sklearn_version": sklearn.__version__,
+        "candidates": summaries,
+    }
+    registry = ModelRegistry(registry_dir)
+    version = registry.register(pipeline, meta)
+    print(f"✅ Registered {version}: {best['params']} (CV R² {best['mean_r2']}, test R² {meta['test_r2']}, "
+          f"search {meta['search_seconds']}s)")
+    if promote:
+        registry.promote(version, model_path)
+        print(f"✅ Promoted {version} -> {model_path}")
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the student performance pipeline.")
+    parser.add_argument("--data", default=DATASET_PATH)
+    parser.add_argument("--out", default=MODEL_PATH)
+    parser.add_argument("--force", action="store_true", help="retrain even if the dataset is unchanged")
+    parser.add_argument("--search", action="store_true",
+                        help="cross-validated parameter search; the best pipeline is registered and promoted")
+    parser.add_argument("--grid", default="default", choices=sorted(SEARCH_GRIDS))
+    parser.add_argument("--cv", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="worker processes (-1: all cores)")
+    parser.add_argument("--max-latency-ms", type=float, help="only select candidates this fast on one row")
+    parser.add_argument("--registry", default=MODEL_REGISTRY_DIR)
+    parser.add_argument("--no-promote", action="store_true", help="register without serving it")
+    parser.add_argument("--promote", metavar="VERSION", help="serve an already registered version")
+    parser.add_argument("--list", action="store_true", help="list registered versions")
+    args = parser.parse_args()
+
+    if args.list:
+        registry = ModelRegistry(args.registry)
+        latest = registry.latest()
+        for version in registry.versions():
+            meta = registry.meta(version)
+            print(f"{'*' if version == latest else ' '} {version}  test R² {meta.get('test_r2')}  {meta.get('params')}")
+    elif args.promote:
+        ModelRegistry(args.registry).promote(args.promote, args.out)
+        print(f"✅ Promoted {args.promote} -> {args.out}")
+    elif args.search:
+        search(args.data, args.out, grid=args.grid, cv=args.cv, n_jobs=args.jobs,
+               max_latency_ms=args.max_latency_ms, registry_dir=args.registry, promote=not args.no_promote)
+    elif args.force:
+        train(args.data, args.out, args.registry)
+    else:
+        load_or_train(args.data, args.out, registry_dir=args.registry)
@@ -1,7 +1,20 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import io
+from fastapi.responses import JSONResponse, Response
+from typing import Optional
+import numpy as np
+import os
+
+from aggregates import compute_aggregates
+from charts import (encode_json, etag_for, etag_matches, records, histogram, group_means, value_counts,
+                    accepts_gzip, gzip_body, ChartsGZipMiddleware, ResponseCache, CHARTS_PATH,
+                    DEFAULT_BINS, GZIP_MIN_BYTES)
+from ingest import sniff_kind, spool_upload, read_columns, iter_chunks, concat_chunks, remove_quietly
+from dataset_store import get_dataset_store
+from jobs import FAILED, JobError, get_job_manager, in_job_worker, router as jobs_router
+from metrics import cache_lookup, capture, instrument, replay, stage, timed_iter, timed_predict
+from model_store import get_model_store
+from prediction_cache import get_prediction_cache
 
 app = FastAPI()
 
@@ -12,9 +25,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-uploaded_data = None
+# Compress large JSON payloads for clients that accept gzip (charts-data
+# serves its own cached gzip bodies)
+app.add_middleware(ChartsGZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
+# Request latency/size metrics, stage timers and /metrics
+instrument(app, "upload")
+
+# Uploaded data, published as immutable versioned snapshots; the
+# aggregates are computed once per version when a snapshot is built
+dataset = get_dataset_store(
+    "dashboard",
+    derive=lambda df, version: {"aggregates": compute_aggregates(df, version)},
+)
+
+# Encoded charts-data responses kept per snapshot, keyed by ETag and
+# content encoding, up to this many bytes in total
+CHARTS_CACHE_BYTES = int(os.environ.get("CHARTS_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Shared, memory-mapped model that hot-reloads when the artifact is replaced
+model_store = get_model_store()
+
+# Re-uploaded datasets are served from the prediction cache
+prediction_cache = get_prediction_cache()
+
+# Uploads are parsed and scored in a worker pool, off the event loop
+jobs = get_job_manager()
+app.include_router(jobs_router)
 
 REQUIRED_COLUMNS = [
     "Student_ID", "First_Name", "Last_Name", "Email", "Gender", "Age",
@@ -25,29 +65,110 @@ REQUIRED_COLUMNS = [
     "Stress_Level (1-10)", "Sleep_Hours_per_Night", "Total_Score_Recalculated"
 ]
 
-@app.post("/upload-data/")
-async def upload_data(file: UploadFile = File(...)):
-    global uploaded_data
-    contents = await file.read()
-    filename = file.filename.lower()
+def process_upload(report, path, kind):
+    # Runs in a job worker; metrics are captured and replayed by finish_upload
+    with capture() as observations:
+        summary, df = build_upload(report, path, kind)
+    return summary, df, observations
+
+
+def score_chunks(report, path, kind, scoring: bool, totals: dict):
+    # Parse, downcast and score chunk by chunk; totals collects the row and
+    # column counts for the summary
+    for chunk in timed_iter("upload", "parse", iter_chunks(path, kind)):
+        if scoring:
+            try:
+                version, model = model_store.predictor(len(chunk))
+                with stage("upload", "predict", rows=len(chunk)):
+                    chunk['Predicted_Score'] = prediction_cache.predict(
+                        model, version, chunk,
+                        lambda frame: timed_predict("upload", model, frame))
+            except Exception as e:
+                raise JobError(f"Prediction error: {str(e)}", status_code=500)
+            chunk['Risk_Level'] = np.where(chunk['Predicted_Score'] < 50, 'At Risk', 'Not At Risk')
+        totals["rows"] += len(chunk)
+        totals["columns"] = len(chunk.columns)
+        report(stage="scoring", rows_processed=totals["rows"])
+        yield chunk
+
 
+def build_upload(report, path, kind):
     try:
-        # Read file
-        if filename.endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(contents))
-        elif filename.endswith((".xlsx", ".xls")):
-            df = pd.read_excel(io.BytesIO(contents))
+        scoring = model_store.ready()
+        totals = {"rows": 0, "columns": 0}
+        chunks = score_chunks(report, path, kind, scoring, totals)
+        df = None
+        if dataset.streams:
+            # Each chunk goes straight to the Arrow snapshot as it is scored,
+            # so the whole frame is never held here
+            with stage("upload", "publish"):
+                dataset.publish_chunks(chunks, load=not in_job_worker())
         else:
+            with stage("upload", "concat"):
+                df = concat_chunks(list(chunks))
+
+        summary = {
+            "message": "File uploaded and predictions generated successfully." if scoring
+                       else "File uploaded successfully.",
+            "rows": totals["rows"],
+            "columns": totals["columns"]
+        }
+
+        if df is None:
+            return summary, None
+        report(stage="publishing", rows_processed=totals["rows"])
+        if in_job_worker() and not dataset.shared_dir:
+            # Only the API process can publish it; hand the frame back
+            return summary, df
+        with stage("upload", "publish", rows=len(df)):
+            if in_job_worker():
+                dataset.publish_shared(df)
+            else:
+                # Publish the fully built frame; readers switch over atomically
+                dataset.publish(df)
+        return summary, None
+
+    except JobError:
+        raise
+    except Exception as e:
+        print("Upload error:", str(e))
+        raise JobError(f"Failed to read file: {str(e)}")
+    finally:
+        remove_quietly(path)
+
+
+def finish_upload(job, value):
+    summary, df, observations = value
+    replay(observations)
+    if df is not None:
+        with stage("upload", "publish", rows=len(df)):
+            dataset.publish(df)
+    return summary
+
+
+@app.post("/upload-data/")
+async def upload_data(
+    file: UploadFile = File(...),
+    async_job: bool = Query(False, description="Return 202 with a job id instead of waiting"),
+):
+    # Spool to disk and parse in chunks so raw bytes and the frame never coexist in memory
+    path = await spool_upload(file, suffix=os.path.splitext((file.filename or "").lower())[1])
+
+    try:
+        # The format comes from the content, not the file name
+        kind = sniff_kind(path, file.filename)
+        if kind is None:
             raise HTTPException(status_code=400, detail="Unsupported file type. Upload a .csv or .xlsx file.")
 
-        # Normalize column headers
-        df.columns = [col.strip() for col in df.columns]
-        print("Uploaded file columns:", df.columns.tolist())
+        # Normalize column headers (header row only, before reading any data)
+        with stage("upload", "validate"):
+            columns = read_columns(path, kind)
+        print("Uploaded file columns:", columns)
 
         # Strict match check
-        if list(df.columns) != REQUIRED_COLUMNS:
-            missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
-            extra = [col for col in df.columns if col not in REQUIRED_COLUMNS]
+        if columns != REQUIRED_COLUMNS:
+            missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+            extra = [col for col in columns if col not in REQUIRED_COLUMNS]
 
             print("Missing columns:", missing)
             print("Extra columns:", extra)
@@ -67,91 +188,132 @@ async def upload_data(file: UploadFile = File(...)):
             error_msg = "\n".join(error_lines)
             raise HTTPException(status_code=400, detail=error_msg)
 
-        # Store uploaded data
-        uploaded_data = df
-
-        return {
-            "message": "File uploaded successfully.",
-            "rows": len(df),
-            "columns": len(df.columns)
-        }
-
+    except HTTPException:
+        remove_quietly(path)
+        raise
     except Exception as e:
+        remove_quietly(path)
         print("Upload error:", str(e))
         raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
 
+    # Scoring runs in the job pool; the spooled file is removed once the job
+    # ends, also when its worker process dies
+    job = jobs.submit("upload-data", process_upload, path, kind, on_done=finish_upload,
+                      cleanup=lambda: remove_quietly(path))
+    if async_job:
+        return JSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}",
+        })
+
+    await jobs.wait(job)
+    if job.status == FAILED:
+        raise HTTPException(status_code=job.error_status or 500, detail=job.error)
+    return jobs.result(job)
+
 
 @app.get("/dashboard/summary")
 def get_summary():
-    global uploaded_data
-    if uploaded_data is None:
+    snapshot = dataset.current()
+    if snapshot is None:
         return {"error": "No data uploaded yet."}
 
+    aggregates = snapshot.derived["aggregates"]
     try:
-        avg_score = uploaded_data['Final_Score'].mean()
-        at_risk_count = len(uploaded_data[uploaded_data['Final_Score'] < 50])
         return {
-            "average_score": round(avg_score, 2),
-            "at_risk_students": at_risk_count,
+            "average_score": aggregates["average_score"],
+            "at_risk_students": aggregates["at_risk_students"],
+            "version": aggregates["version"],
         }
     except Exception as e:
         print("Summary error:", str(e))
         return {"error": f"Failed to generate summary: {str(e)}"}
 
 
-@app.get("/dashboard/charts-data")
-def get_charts_data():
-    global uploaded_data
-    if uploaded_data is None:
+def build_charts_payload(snapshot, columns, offset, limit, aggregate, column, by, bins):
+    df = snapshot.frame
+
+    if aggregate is not None:
+        if column is None or column not in df.columns:
+            raise HTTPException(status_code=400, detail="Aggregates need a valid 'column'.")
+        if aggregate == "histogram":
+            return histogram(df, column, bins)
+        if aggregate == "mean":
+            if by not in df.columns:
+                raise HTTPException(status_code=400, detail="Mean aggregates need a valid 'by' column.")
+            return group_means(df, by, column)
+        if aggregate == "count":
+            return value_counts(df, column)
+        raise HTTPException(status_code=400, detail="Unknown aggregate. Use histogram, mean or count.")
+
+    if columns:
+        selected = [col.strip() for col in columns.split(",") if col.strip()]
+        unknown = [col for col in selected if col not in df.columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+        df = df[selected]
+
+    if limit is None:
+        # Unpaginated requests keep the original plain-list shape
+        return records(df.iloc[offset:])
+
+    page = df.iloc[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(df) else None
+    return {
+        "version": snapshot.version,
+        "total": len(df),
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset,
+        "data": records(page),
+    }
+
+
+@app.get(CHARTS_PATH)
+def get_charts_data(
+    request: Request,
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    aggregate: Optional[str] = Query(None, description="histogram, mean or count"),
+    column: Optional[str] = None,
+    by: str = "Department",
+    bins: int = Query(DEFAULT_BINS, ge=1),
+):
+    snapshot = dataset.current()
+    if snapshot is None:
         return []
 
-    # Replace NaN with None for JSON compatibility
-    safe_data = uploaded_data.where(pd.notnull(uploaded_data), None)
-    return safe_data.to_dict(orient="records")
-
-@app.post("/upload-data/")
-async def upload_data(file: UploadFile = File(...)):
-    global uploaded_data
-    contents = await file.read()
-    filename = file.filename.lower()
-
-    try:
-        # Read file
-        if filename.endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(contents))
-        elif filename.endswith((".xlsx", ".xls")):
-            df = pd.read_excel(io.BytesIO(contents))
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type. Upload a .csv or .xlsx file.")
-
-        # Normalize columns and validation here as before...
-
-        # Rename columns for model input if needed
-        if 'Attendance' in df.columns:
-            df['Attendance (%)'] = df.pop('Attendance')
-        if 'Stress_Level' in df.columns:
-            df['Stress_Level (1-10)'] = df.pop('Stress_Level')
-
-        # Store uploaded data
-        uploaded_data = df
-
-        # Perform bulk prediction if model loaded
-        if model is not None:
-            try:
-                predictions = model.predict(df)
-                df['Predicted_Score'] = predictions
-                df['Risk_Level'] = df['Predicted_Score'].apply(lambda x: 'At Risk' if x < 50 else 'Not At Risk')
-                uploaded_data = df  # Update global with prediction results included
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
-
-        return {
-            "message": "File uploaded and predictions generated successfully.",
-            "rows": len(df),
-            "columns": len(df.columns),
-        }
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to read file: {str(e)}")
-
-
+    params = {"columns": columns, "offset": offset, "limit": limit,
+              "aggregate": aggregate, "column": column, "by": by, "bins": bins}
+    etag = etag_for(snapshot.version, params)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if etag_matches(", ".join(request.headers.getlist("if-none-match")), etag):
+        return Response(status_code=304, headers=headers)
+
+    charts_cache = snapshot.cache.get("charts")
+    if charts_cache is None:
+        charts_cache = snapshot.cache.setdefault("charts", ResponseCache(CHARTS_CACHE_BYTES))
+    # The gzip-encoded body is cached next to the plain one, so cache hits
+    # are not recompressed on every request
+    wants_gzip = accepts_gzip(request.headers.get("accept-encoding"))
+    gzipped = charts_cache.get((etag, "gzip")) if wants_gzip else None
+    body = gzipped or charts_cache.get((etag, "identity"))
+    cache_lookup("charts", body is not None)
+    if body is None:
+        with stage("upload", "charts"):
+            payload = build_charts_payload(snapshot, columns, offset, limit, aggregate, column, by, bins)
+        with stage("upload", "serialize"):
+            body = encode_json(payload)
+        charts_cache.put((etag, "identity"), body)
+    if wants_gzip and gzipped is None and len(body) >= GZIP_MIN_BYTES:
+        with stage("upload", "compress"):
+            gzipped = gzip_body(body)
+        charts_cache.put((etag, "gzip"), gzipped)
+
+    if gzipped is not None:
+        body = gzipped
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)